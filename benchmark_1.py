@@ -0,0 +1,241 @@
+"""
+Least Recently Used Cache - benchmarks
+
+Run with: python benchmark_1.py
+"""
+import itertools
+import os
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory as TempDir
+
+from problem_1 import LRU_Cache, Sharded_LRU_Cache
+
+
+class GlobalLock_LRU_Cache(object):
+    """A single LRU_Cache behind one lock - this is what we had to do before sharding"""
+    def __init__(self, capacity):
+        self.cache = LRU_Cache(capacity)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.cache.get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            self.cache.set(key, value)
+
+
+def run_contention(cache, num_threads, ops_per_thread, key_space):
+    """Hammer the cache from a thread pool - each op is a get, followed by a set on a miss
+
+    Args:
+        cache: any object with get/set methods
+        num_threads (int): number of worker threads
+        ops_per_thread (int): operations each worker performs
+        key_space (int): keys are drawn from range(key_space)
+    Returns:
+        operations per second
+    """
+    def worker(seed):
+        rng = random.Random(seed)
+        keys = [rng.randrange(key_space) for _ in range(ops_per_thread)]
+        for key in keys:
+            if cache.get(key) == -1:
+                cache.set(key, key)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        list(pool.map(worker, range(num_threads)))
+    elapsed = time.perf_counter() - start
+    return num_threads * ops_per_thread / elapsed
+
+
+def benchmark_sharding(capacity=4096, num_threads=8, ops_per_thread=50000):
+    print('contention benchmark: capacity={} threads={} ops/thread={}'.format(capacity, num_threads, ops_per_thread))
+    key_space = capacity * 2
+    rate = run_contention(GlobalLock_LRU_Cache(capacity), num_threads, ops_per_thread, key_space)
+    print('  global lock : {:>12,.0f} ops/sec'.format(rate))
+    for num_shards in (1, 4, 16):
+        rate = run_contention(Sharded_LRU_Cache(capacity, num_shards), num_threads, ops_per_thread, key_space)
+        print('  {:>2} shard(s) : {:>12,.0f} ops/sec'.format(num_shards, rate))
+
+
+def measure_memory_per_entry(backend, capacity):
+    """Fill a cache and measure how many bytes each entry costs (the keys and values are shared ints)
+
+    Args:
+        backend (str): LRU_Cache backend to measure
+        capacity (int): number of entries to store
+    Returns:
+        bytes per entry
+    """
+    keys = list(range(capacity))
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    cache = LRU_Cache(capacity, backend)
+    for key in keys:
+        cache.set(key, key)
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / capacity
+
+
+def measure_ops_per_sec(backend, capacity, num_ops):
+    """Run a get-then-set-on-miss workload over twice the capacity worth of keys
+
+    Args:
+        backend (str): LRU_Cache backend to measure
+        capacity (int): size of the cache
+        num_ops (int): number of operations
+    Returns:
+        operations per second
+    """
+    rng = random.Random(42)
+    keys = [rng.randrange(capacity * 2) for _ in range(num_ops)]
+    cache = LRU_Cache(capacity, backend)
+    start = time.perf_counter()
+    for key in keys:
+        if cache.get(key) == -1:
+            cache.set(key, key)
+    return num_ops / (time.perf_counter() - start)
+
+
+def benchmark_backends(capacity=2**16 - 1, num_ops=500000):
+    print('backend benchmark: capacity={} ops={}'.format(capacity, num_ops))
+    for backend in ('linked', 'array'):
+        memory = measure_memory_per_entry(backend, capacity)
+        rate = measure_ops_per_sec(backend, capacity, num_ops)
+        print('  {:<6} : {:>6.1f} bytes/entry {:>12,.0f} ops/sec'.format(backend, memory, rate))
+
+
+class SteppingClock:
+    """A clock that moves forward a fixed step every time it is read"""
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+def benchmark_ttl(sizes=(10**4, 10**5, 10**6), num_ops=200000):
+    """Time get/set on caches full of TTL'd entries that keep expiring while we measure"""
+    print('ttl benchmark: ops={}'.format(num_ops))
+    for size in sizes:
+        rng = random.Random(42)
+        clock = SteppingClock(step=0.0001)
+        cache = LRU_Cache(size, clock=clock)
+        for key in range(size):
+            cache.set(key, key, ttl=rng.uniform(1, 600))
+        keys = [rng.randrange(size * 2) for _ in range(num_ops)]
+        ttls = [rng.uniform(1, 600) for _ in range(num_ops)]
+        start = time.perf_counter()
+        for key, ttl in zip(keys, ttls):
+            if cache.get(key) == -1:
+                cache.set(key, key, ttl=ttl)
+        elapsed = time.perf_counter() - start
+        print('  {:>9,} entries : {:>7.0f} ns/op, {:>9,} entries left'.format(
+            size, elapsed / num_ops * 1e9, cache.cache_size))
+
+
+def zipf_trace(num_keys, length, exponent=1.0, seed=42):
+    """Generate keys whose popularity follows a Zipf distribution
+
+    Args:
+        num_keys (int): number of distinct keys
+        length (int): length of the trace
+        exponent (float): the Zipf exponent - higher means more skewed
+        seed (int): random seed
+    Returns:
+        list of keys
+    """
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, num_keys + 1)))
+    return rng.choices(range(num_keys), cum_weights=cum_weights, k=length)
+
+
+def scan_trace(num_keys, length, scan_length, scan_every, seed=42):
+    """Generate a Zipf trace that is interrupted by long scans over keys that are never seen again
+
+    Args:
+        num_keys (int): number of distinct keys in the Zipf part
+        length (int): length of the Zipf part of the trace
+        scan_length (int): number of keys in each scan
+        scan_every (int): number of Zipf accesses between scans
+        seed (int): random seed
+    Returns:
+        list of keys
+    """
+    trace = []
+    next_scan_key = num_keys
+    zipf = zipf_trace(num_keys, length, seed=seed)
+    for start in range(0, length, scan_every):
+        trace.extend(zipf[start:start + scan_every])
+        trace.extend(range(next_scan_key, next_scan_key + scan_length))
+        next_scan_key += scan_length
+    return trace
+
+
+def replay(cache, trace):
+    """Replay a trace against a cache, setting every key that misses
+
+    Args:
+        cache: any object with get/set methods
+        trace (list): keys to access
+    Returns:
+        tuple of (hit ratio, operations per second)
+    """
+    hits = 0
+    start = time.perf_counter()
+    for key in trace:
+        if cache.get(key) == -1:
+            cache.set(key, key)
+        else:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    return hits / len(trace), len(trace) / elapsed
+
+
+def benchmark_policies(capacity=1000, num_keys=100000, length=500000):
+    print('policy benchmark: capacity={} keys={}'.format(capacity, num_keys))
+    traces = [
+        ('zipf', zipf_trace(num_keys, length)),
+        ('scan', scan_trace(num_keys, length, scan_length=capacity * 2, scan_every=capacity * 10)),
+    ]
+    for name, trace in traces:
+        for policy in ('lru', 'tinylfu'):
+            hit_ratio, rate = replay(LRU_Cache(capacity, policy=policy), trace)
+            print('  {:<4} {:<7} : hit ratio {:>6.2%} {:>12,.0f} ops/sec'.format(name, policy, hit_ratio, rate))
+
+
+def benchmark_snapshot(num_entries=10**6):
+    print('snapshot benchmark: entries={}'.format(num_entries))
+    with TempDir() as directory:
+        path = os.path.join(directory, 'cache.snapshot')
+        for backend in ('linked', 'array'):
+            cache = LRU_Cache(num_entries, backend)
+            for key in range(num_entries):
+                cache.set(key, 'value {}'.format(key))
+            start = time.perf_counter()
+            cache.save(path)
+            save_time = time.perf_counter() - start
+            restored = LRU_Cache(num_entries, backend)
+            start = time.perf_counter()
+            restored.load(path)
+            load_time = time.perf_counter() - start
+            print('  {:<6} : save {:>6.3f}s load {:>6.3f}s ({:,} bytes)'.format(
+                backend, save_time, load_time, os.path.getsize(path)))
+
+
+if __name__ == '__main__':
+    benchmark_sharding()
+    benchmark_backends()
+    benchmark_ttl()
+    benchmark_policies()
+    benchmark_snapshot()
@@ -0,0 +1,86 @@
+"""
+Find Files - benchmarks
+
+Run with: python benchmark_2.py [number of files]
+"""
+import os
+import sys
+import time
+from tempfile import TemporaryDirectory as TempDir
+
+from problem_2 import FileIndex, find_files
+
+
+def make_tree(root, num_files, files_per_directory=500, fan_out=10):
+    """Generate a directory tree of empty files, a quarter of them ending with .c
+
+    Args:
+        root (str): directory to create the tree in
+        num_files (int): total number of files
+        files_per_directory (int): files in each leaf directory
+        fan_out (int): subdirectories per directory
+    """
+    num_directories = max(1, num_files // files_per_directory)
+    for index in range(num_directories):
+        # spread the leaf directories over a tree of fan_out subdirectories per level
+        parts = []
+        rest = index
+        while True:
+            rest, part = divmod(rest, fan_out)
+            parts.append('d{}'.format(part))
+            if rest == 0:
+                break
+        directory = os.path.join(root, *parts, 'leaf')
+        os.makedirs(directory)
+        for number in range(files_per_directory):
+            name = 'f{}.{}'.format(number, 'c' if number % 4 == 0 else 'h')
+            open(os.path.join(directory, name), 'w').close()
+
+
+def benchmark_workers(num_files=500000):
+    with TempDir() as root:
+        start = time.perf_counter()
+        make_tree(root, num_files)
+        print('parallel walk benchmark: {:,} files (generated in {:.1f}s)'.format(
+            num_files, time.perf_counter() - start))
+        for workers in (1, 2, 8, 32):
+            start = time.perf_counter()
+            found = find_files('.c', root, workers=workers)
+            elapsed = time.perf_counter() - start
+            label = 'serial' if workers == 1 else '{} workers'.format(workers)
+            print('  {:<10} : {:>7.3f}s ({:,} found)'.format(label, elapsed, len(found)))
+
+
+def benchmark_index(num_files=1000000):
+    with TempDir() as root:
+        make_tree(root, num_files)
+        print('file index benchmark: {:,} files'.format(num_files))
+        start = time.perf_counter()
+        find_files('.c', root)
+        print('  find_files          : {:>8.3f}s'.format(time.perf_counter() - start))
+        index = FileIndex(root)
+        start = time.perf_counter()
+        listed = index.refresh()
+        print('  first refresh       : {:>8.3f}s ({:,} directories listed)'.format(time.perf_counter() - start, listed))
+        # the tree was only just generated, so every directory is within the racy window and listed again
+        start = time.perf_counter()
+        listed = index.refresh()
+        print('  second refresh      : {:>8.3f}s ({:,} directories listed)'.format(time.perf_counter() - start, listed))
+        for suffix in ('.c', '.h'):
+            start = time.perf_counter()
+            index.find_files(suffix, refresh=False)
+            print('  index query {:<8}: {:>8.3f}s'.format(suffix, time.perf_counter() - start))
+            start = time.perf_counter()
+            index.find_files(suffix)
+            print('  refresh + query {:<4}: {:>8.3f}s'.format(suffix, time.perf_counter() - start))
+        time.sleep(FileIndex.racy_window_ns / 10**9)
+        index.refresh()
+        start = time.perf_counter()
+        listed = index.refresh()
+        print('  unchanged refresh   : {:>8.3f}s ({:,} directories listed)'.format(time.perf_counter() - start, listed))
+
+
+if __name__ == '__main__':
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    benchmark_workers(num_files or 500000)
+    benchmark_index(num_files or 1000000)
@@ -0,0 +1,161 @@
+"""
+Huffman Coding - benchmarks
+
+Run with: python benchmark_3.py [size in bytes]
+"""
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from tempfile import TemporaryDirectory as TempDir
+
+from problem_3 import (huffman_compress_blocks, huffman_compress_parallel, huffman_compress_stream, huffman_decode,
+                       huffman_decompress_blocks, huffman_decompress_parallel, huffman_decompress_stream,
+                       huffman_code_lengths, huffman_encode)
+
+
+def text_corpus(size, seed=42):
+    """English-like text: words of random letters with Zipf-ish word frequencies"""
+    rng = random.Random(seed)
+    letters = b'etaoinshrdlcumwfgypbvkjxqz'
+    weights = [1 / (rank + 1) for rank in range(len(letters))]
+    words = [bytes(rng.choices(letters, weights, k=rng.randint(1, 10))) for _ in range(5000)]
+    word_weights = [1 / (rank + 1) for rank in range(len(words))]
+    out = bytearray()
+    while len(out) < size:
+        out += b' '.join(rng.choices(words, word_weights, k=10000)) + b'.\n'
+    return bytes(out[:size])
+
+
+def skewed_corpus(size, seed=42):
+    """Bytes with a geometric distribution, so a few symbols get very short codes and the rest long ones"""
+    rng = random.Random(seed)
+    weights = [0.5 ** symbol for symbol in range(32)]
+    return bytes(rng.choices(range(32), weights, k=size))
+
+
+def fibonacci_corpus(size, seed=42):
+    """Bytes with fibonacci frequencies - the worst case for code length"""
+    weights = [1, 1]
+    while len(weights) < 40:
+        weights.append(weights[-1] + weights[-2])
+    return bytes(random.Random(seed).choices(range(len(weights)), weights, k=size))
+
+
+def random_corpus(size, seed=42):
+    """Uniformly random bytes - nothing to compress"""
+    return random.Random(seed).randbytes(size)
+
+
+CORPORA = [
+    ('text', text_corpus),
+    ('skewed', skewed_corpus),
+    ('random', random_corpus),
+]
+
+
+def benchmark_round_trip(size=10 * 2**20):
+    print('encode/decode benchmark: {:,} bytes per corpus'.format(size))
+    for name, make_corpus in CORPORA:
+        data = make_corpus(size)
+        start = time.perf_counter()
+        encoded = huffman_encode(data)
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = huffman_decode(encoded)
+        decode_time = time.perf_counter() - start
+        if decoded != data:
+            raise AssertionError('round trip failed for the {} corpus'.format(name))
+        print('  {:<6} : ratio {:>6.2%}  encode {:>6.1f} MB/s  decode {:>6.1f} MB/s'.format(
+            name, len(encoded) / len(data), size / encode_time / 1e6, size / decode_time / 1e6))
+
+
+def time_file_to_file(function, source_path, sink_path, *args):
+    """Run function(source, sink, *args) on two files, then run it again to find the peak memory
+    allocated (tracing the allocations slows it down too much to time the same run)
+
+    Returns:
+        tuple of (seconds, peak bytes allocated)
+    """
+    with open(source_path, 'rb') as source, open(sink_path, 'wb') as sink:
+        start = time.perf_counter()
+        function(source, sink, *args)
+        elapsed = time.perf_counter() - start
+    with open(source_path, 'rb') as source, open(sink_path, 'wb') as sink:
+        tracemalloc.start()
+        function(source, sink, *args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def benchmark_stream(size=20 * 2**20, chunk_size=2**20):
+    print('stream benchmark: {:,} bytes, {:,} byte chunks'.format(size, chunk_size))
+    with TempDir() as directory:
+        original = os.path.join(directory, 'original')
+        encoded = os.path.join(directory, 'encoded')
+        decoded = os.path.join(directory, 'decoded')
+        with open(original, 'wb') as f:
+            # write the file in pieces, so generating it doesn't need the whole thing in memory
+            for seed in range(0, size, chunk_size):
+                f.write(text_corpus(min(chunk_size, size - seed), seed=seed))
+        modes = [
+            ('stream', huffman_compress_stream, huffman_decompress_stream, (chunk_size,)),
+            ('blocks', huffman_compress_blocks, huffman_decompress_blocks, ()),
+        ]
+        for name, compress, decompress, args in modes:
+            compress_time, compress_peak = time_file_to_file(compress, original, encoded, *args)
+            decompress_time, decompress_peak = time_file_to_file(decompress, encoded, decoded)
+            with open(original, 'rb') as f, open(decoded, 'rb') as g:
+                if f.read() != g.read():
+                    raise AssertionError('round trip failed in {} mode'.format(name))
+            print('  {:<6} : ratio {:>6.2%}  compress {:>5.1f} MB/s (peak {:>5.1f} MB)  '
+                  'decompress {:>5.1f} MB/s (peak {:>5.1f} MB)'.format(
+                      name, os.path.getsize(encoded) / size,
+                      size / compress_time / 1e6, compress_peak / 1e6,
+                      size / decompress_time / 1e6, decompress_peak / 1e6))
+
+
+def benchmark_workers(size=32 * 2**20, block_size=2**20):
+    print('parallel benchmark: {:,} bytes, {:,} byte blocks, {} CPUs'.format(size, block_size, os.cpu_count()))
+    data = text_corpus(size)
+    for workers in (1, 2, 4, 8):
+        encoded = io.BytesIO()
+        start = time.perf_counter()
+        huffman_compress_parallel(io.BytesIO(data), encoded, workers, block_size)
+        compress_time = time.perf_counter() - start
+        decoded = io.BytesIO()
+        start = time.perf_counter()
+        huffman_decompress_parallel(encoded, decoded, workers)
+        decompress_time = time.perf_counter() - start
+        if decoded.getvalue() != data:
+            raise AssertionError('round trip failed with {} workers'.format(workers))
+        print('  {:>2} worker(s) : compress {:>6.1f} MB/s  decompress {:>6.1f} MB/s'.format(
+            workers, size / compress_time / 1e6, size / decompress_time / 1e6))
+
+
+def benchmark_length_limits(size=4 * 2**20, limits=(15, 12, 10, 8)):
+    """Compare the average code length with and without a limit on the longest code"""
+    print('length limit benchmark: {:,} bytes per corpus, bits per byte (cost vs no limit)'.format(size))
+    for name, make_corpus in CORPORA + [('fibonacci', fibonacci_corpus)]:
+        char_freq = Counter(make_corpus(size))
+        code_lengths = huffman_code_lengths(char_freq)
+        unlimited = sum(char_freq[symbol] * length for symbol, length in code_lengths.items()) / size
+        columns = []
+        for max_length in limits:
+            limited_lengths = huffman_code_lengths(char_freq, max_length)
+            limited = sum(char_freq[symbol] * length for symbol, length in limited_lengths.items()) / size
+            columns.append('{:>2} bits: {:.4f} ({:+.3%})'.format(max_length, limited, limited / unlimited - 1))
+        print('  {:<9} : longest {:>2} bits, {:.4f}  {}'.format(
+            name, max(code_lengths.values()), unlimited, '  '.join(columns)))
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    benchmark_round_trip(size or 10 * 2**20)
+    benchmark_stream(size or 20 * 2**20)
+    benchmark_workers(size or 32 * 2**20)
+    benchmark_length_limits(size or 4 * 2**20)
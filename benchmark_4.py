@@ -0,0 +1,183 @@
+"""
+Active Directory - benchmarks
+
+Run with: python benchmark_4.py
+"""
+import random
+import time
+import tracemalloc
+
+from problem_4 import (CompactDirectory, Group, MembershipIndex, check_many, is_user_in_group, load_memberships,
+                       walk_groups)
+
+
+def recursive_is_user_in_group(user, group):
+    """The original recursive search - no visited set, so shared subgroups are searched every time"""
+    for group_user in group.get_users():
+        if group_user == user:
+            return True
+    for subgroup in group.get_groups():
+        if recursive_is_user_in_group(user, subgroup):
+            return True
+    return False
+
+
+def iterative_is_user_in_group(user, group):
+    """Walk the groups with a visited set, but without remembering anything between calls"""
+    return any(user in subgroup.get_users() for subgroup in walk_groups(group))
+
+
+def deep_chain(depth):
+    """Each group contains the next one, and the user is at the bottom"""
+    groups = [Group('group{}'.format(i)) for i in range(depth)]
+    for parent, child in zip(groups, groups[1:]):
+        parent.add_group(child)
+    groups[-1].add_user('user')
+    return groups[0]
+
+
+def wide_fan_out(width, users_per_group=10):
+    """One group with width subgroups, and the user in the last one"""
+    root = Group('root')
+    for i in range(width):
+        group = Group('group{}'.format(i))
+        for j in range(users_per_group):
+            group.add_user('user{}-{}'.format(i, j))
+        root.add_group(group)
+    group.add_user('user')
+    return root
+
+
+def diamond_lattice(depth):
+    """Layers of two groups, each containing both groups in the next layer, and the user at the bottom"""
+    layers = [[Group('a{}'.format(i)), Group('b{}'.format(i))] for i in range(depth)]
+    for layer, next_layer in zip(layers, layers[1:]):
+        for group in layer:
+            for subgroup in next_layer:
+                group.add_group(subgroup)
+    layers[-1][1].add_user('user')
+    return layers[0][0]
+
+
+def time_checks(check, root, num_checks):
+    """Returns microseconds per check, checking a user that is found and one that isn't"""
+    start = time.perf_counter()
+    for _ in range(num_checks):
+        if not check('user', root) or check('nobody', root):
+            raise AssertionError('wrong answer')
+    return (time.perf_counter() - start) / (num_checks * 2) * 1e6
+
+
+def benchmark_traversal(num_checks=20):
+    print('traversal benchmark: microseconds per check')
+    shapes = [
+        ('chain of 900', deep_chain(900)),
+        ('chain of 100,000', deep_chain(100000)),
+        ('fan-out of 10,000', wide_fan_out(10000)),
+        ('diamond of 20 layers', diamond_lattice(20)),
+        ('diamond of 1,000 layers', diamond_lattice(1000)),
+    ]
+    for name, root in shapes:
+        results = []
+        # the recursive search overflows the stack on deep chains and takes forever on deep diamonds
+        if name not in ('chain of 100,000', 'diamond of 1,000 layers'):
+            results.append(('recursive', time_checks(recursive_is_user_in_group, root, 1)))
+        results.append(('iterative', time_checks(iterative_is_user_in_group, root, num_checks)))
+        results.append(('memoized', time_checks(is_user_in_group, root, num_checks)))
+        index = MembershipIndex(root)
+        results.append(('index', time_checks(index.is_user_in_group, root, num_checks)))
+        print('  {:<24}: {}'.format(name, '  '.join(
+            '{} {:>12,.1f}'.format(label, micros) for label, micros in results)))
+
+
+def membership_export(num_groups, num_users, num_memberships, seed=42):
+    """Generate membership rows: a tree of groups (ten subgroups each, plus a few extra parents)
+    and users put in random groups
+
+    Yields:
+        (group name, member type, member name) rows
+    """
+    rng = random.Random(seed)
+    num_rows = 0
+    for i in range(1, num_groups):
+        yield 'group{}'.format((i - 1) // 10), 'group', 'group{}'.format(i)
+        num_rows += 1
+        if i % 100 == 0:
+            # a second parent higher up the tree
+            yield 'group{}'.format(rng.randrange(i // 100)), 'group', 'group{}'.format(i)
+            num_rows += 1
+    for _ in range(num_memberships - num_rows):
+        yield 'group{}'.format(rng.randrange(num_groups)), 'user', 'user{}'.format(rng.randrange(num_users))
+
+
+def benchmark_bulk(num_groups=10000, num_users=200000, num_memberships=10**6, num_checks=100000):
+    print('bulk benchmark: {:,} groups, {:,} users, {:,} memberships, {:,} checks'.format(
+        num_groups, num_users, num_memberships, num_checks))
+    rows = list(membership_export(num_groups, num_users, num_memberships))
+    start = time.perf_counter()
+    groups = load_memberships(rows)
+    print('  load       : {:>7.3f}s'.format(time.perf_counter() - start))
+    rng = random.Random(42)
+    # half of the groups asked about are near the top of the tree, where they have many descendants
+    pairs = [('user{}'.format(rng.randrange(num_users)),
+              groups['group{}'.format(rng.randrange(num_groups if i % 2 else num_groups // 100))])
+             for i in range(num_checks)]
+    start = time.perf_counter()
+    answers = check_many(pairs)
+    print('  check_many : {:>7.3f}s ({:,} true)'.format(time.perf_counter() - start, sum(answers)))
+    sample = pairs[:num_checks // 100]
+    start = time.perf_counter()
+    for (user, group), answer in zip(sample, answers):
+        if is_user_in_group(user, group) != answer:
+            raise AssertionError('wrong answer')
+    print('  one by one : {:>7.3f}s (estimated from {:,} checks)'.format(
+        (time.perf_counter() - start) * num_checks / len(sample), len(sample)))
+
+
+def measure_load(load, make_rows):
+    """Returns (directory, seconds, bytes allocated) to load the rows - the rows are generated as
+    they are loaded, so names that are kept count towards the memory, as they would from a real
+    export. Tracing allocations is slow, so the memory is measured on a second load."""
+    start = time.perf_counter()
+    load(make_rows())
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    directory = load(make_rows())
+    end_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return directory, elapsed, end_memory - start_memory
+
+
+def load_compact(rows):
+    directory = CompactDirectory()
+    directory.load_memberships(rows)
+    return directory
+
+
+def benchmark_compact(num_groups=10000, num_users=200000, num_memberships=10**6, num_checks=100000):
+    print('compact benchmark: {:,} groups, {:,} users, {:,} memberships'.format(
+        num_groups, num_users, num_memberships))
+    rng = random.Random(42)
+    checks = [('user{}'.format(rng.randrange(num_users)), 'group{}'.format(rng.randrange(num_groups // 100)))
+              for i in range(num_checks)]
+    for name, load in (('groups', load_memberships), ('compact', load_compact)):
+        directory, load_time, memory = measure_load(
+            load, lambda: membership_export(num_groups, num_users, num_memberships))
+        if name == 'groups':
+            pairs = [(user, directory[group]) for user, group in checks]
+            start = time.perf_counter()
+            answers = check_many(pairs)
+        else:
+            pairs = [(user, directory.group(group)) for user, group in checks]
+            start = time.perf_counter()
+            answers = directory.check_many(pairs)
+        check_time = time.perf_counter() - start
+        print('  {:<7} : load {:>6.3f}s  {:>6.1f} MB  {:,} checks {:>6.3f}s ({:,} true)'.format(
+            name, load_time, memory / 1e6, num_checks, check_time, sum(answers)))
+
+
+if __name__ == '__main__':
+    benchmark_traversal()
+    benchmark_bulk()
+    benchmark_compact()
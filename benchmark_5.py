@@ -0,0 +1,129 @@
+"""
+Blockchain - benchmarks
+
+Run with: python benchmark_5.py [number of blocks]
+"""
+import os
+import random
+import sys
+import time
+from tempfile import TemporaryDirectory as TempDir
+
+from problem_5 import Block, BlockStore, DoublyLinkedList, mine_block, verify_chain, verify_merkle_proof
+
+
+def find_in_list(block_chain, block_hash):
+    """Find a block by walking the linked list from the head - what we had before the store"""
+    node = block_chain.head
+    while node:
+        if node.value.hash == block_hash:
+            return node.value
+        node = node.next
+    return None
+
+
+def benchmark_store(num_blocks=200000, num_lookups=10000):
+    print('block store benchmark: {:,} blocks'.format(num_blocks))
+    gmt = time.gmtime()
+    rng = random.Random(42)
+    with TempDir() as path:
+        store = BlockStore(path)
+        block_chain = DoublyLinkedList()
+        hashes = []
+        previous_hash = None
+        start = time.perf_counter()
+        for i in range(num_blocks):
+            block = Block(gmt, 'transaction {}'.format(i), previous_hash)
+            store.append(block)
+            block_chain.append(block)
+            hashes.append(block.hash)
+            previous_hash = block.hash
+        store.close()
+        print('  append (and build the list) : {:>10,.0f} blocks/sec'.format(num_blocks / (time.perf_counter() - start)))
+        start = time.perf_counter()
+        store = BlockStore(path)
+        print('  reopen                      : {:>10.4f}s'.format(time.perf_counter() - start))
+        lookups = rng.choices(hashes, k=num_lookups)
+        start = time.perf_counter()
+        for block_hash in lookups:
+            if store.get(block_hash) is None:
+                raise AssertionError('block not found')
+        print('  store lookup                : {:>10,.0f} lookups/sec'.format(
+            num_lookups / (time.perf_counter() - start)))
+        start = time.perf_counter()
+        for block_hash in lookups[:100]:
+            find_in_list(block_chain, block_hash)
+        print('  linked list lookup          : {:>10,.0f} lookups/sec'.format(100 / (time.perf_counter() - start)))
+        store.close()
+
+
+def benchmark_verify(num_blocks=200000, num_new_blocks=1000):
+    print('verify benchmark: {:,} blocks'.format(num_blocks))
+    key = b'benchmark key'
+    blocks = []
+    previous_hash = None
+    for i in range(num_blocks + num_new_blocks):
+        blocks.append(Block(time.gmtime(1500000000 + i), 'transaction {}'.format(i), previous_hash))
+        previous_hash = blocks[-1].hash
+    for workers in (1, 2, 4):
+        start = time.perf_counter()
+        checkpoint = verify_chain(blocks[:num_blocks], key, workers=workers)
+        print('  full, {} worker(s)     : {:>10,.0f} blocks/sec'.format(
+            workers, num_blocks / (time.perf_counter() - start)))
+    start = time.perf_counter()
+    verify_chain(blocks, key, checkpoint)
+    print('  {:,} new blocks after a checkpoint : {:>8.4f}s'.format(num_new_blocks, time.perf_counter() - start))
+
+
+def benchmark_merkle(num_blocks=50, transactions_per_block=4096, num_proofs=20000):
+    print('merkle benchmark: {:,} blocks of {:,} transactions'.format(num_blocks, transactions_per_block))
+    rng = random.Random(42)
+    batches = [['payment {} from {} to {}'.format(i * transactions_per_block + j, rng.randrange(10**6),
+                                                   rng.randrange(10**6)) for j in range(transactions_per_block)]
+               for i in range(num_blocks)]
+    with TempDir() as path, BlockStore(path) as store:
+        blocks = []
+        previous_hash = None
+        start = time.perf_counter()
+        for transactions in batches:
+            block = Block.from_transactions(time.gmtime(), transactions, previous_hash)
+            store.append(block)
+            blocks.append(block)
+            previous_hash = block.hash
+        elapsed = time.perf_counter() - start
+        print('  append            : {:>10,.0f} transactions/sec'.format(
+            num_blocks * transactions_per_block / elapsed))
+    proofs = []
+    for _ in range(num_proofs):
+        block = rng.choice(blocks)
+        index = rng.randrange(transactions_per_block)
+        proofs.append((block.transactions[index], block.prove(index), block.data))
+    start = time.perf_counter()
+    for transaction, proof, merkle_root in proofs:
+        if not verify_merkle_proof(transaction, proof, merkle_root):
+            raise AssertionError('proof failed')
+    print('  verify proofs     : {:>10,.0f} proofs/sec ({} hashes each)'.format(
+        num_proofs / (time.perf_counter() - start), len(proofs[0][1]) + 1))
+
+
+def benchmark_mining(difficulty=20, num_blocks=3):
+    print('mining benchmark: difficulty {} bits, {} blocks, {} CPUs'.format(difficulty, num_blocks, os.cpu_count()))
+    for workers in (1, 2, 4, 8):
+        previous_hash = None
+        attempts = 0
+        start = time.perf_counter()
+        for i in range(num_blocks):
+            block, tried = mine_block(time.gmtime(), 'block {}'.format(i), previous_hash, difficulty, workers)
+            attempts += tried
+            previous_hash = block.hash
+        elapsed = time.perf_counter() - start
+        print('  {} worker(s) : {:>10,.0f} hashes/sec  {:>6.2f}s per block'.format(
+            workers, attempts / elapsed, elapsed / num_blocks))
+
+
+if __name__ == '__main__':
+    num_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    benchmark_store(num_blocks)
+    benchmark_verify(num_blocks)
+    benchmark_merkle()
+    benchmark_mining()
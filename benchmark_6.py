@@ -0,0 +1,38 @@
+"""
+Union and Intersection - benchmarks
+
+Run with: python benchmark_6.py [largest list size]
+"""
+import random
+import sys
+import time
+
+from problem_6 import LinkedList, intersection, union
+
+
+def benchmark_union(largest=10**6):
+    print('union/intersection benchmark: two lists of n values, drawn from 2n')
+    n = 10**4
+    previous = None
+    while n <= largest:
+        rng = random.Random(42)
+        start = time.perf_counter()
+        llist_1 = LinkedList.from_iterable(rng.randrange(2 * n) for _ in range(n))
+        llist_2 = LinkedList.from_iterable(rng.randrange(2 * n) for _ in range(n))
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        union_size = len(union(llist_1, llist_2))
+        union_time = time.perf_counter() - start
+        start = time.perf_counter()
+        intersection_size = len(intersection(llist_1, llist_2))
+        intersection_time = time.perf_counter() - start
+        # linear time means ten times the values take about ten times as long
+        growth = '' if previous is None else '  ({:.1f}x the time for 10x the values)'.format(union_time / previous)
+        print('  n={:>9,} : build {:>6.3f}s  union {:>6.3f}s ({:,} values)  intersection {:>6.3f}s ({:,} values){}'.format(
+            n, build_time, union_time, union_size, intersection_time, intersection_size, growth))
+        previous = union_time
+        n *= 10
+
+
+if __name__ == '__main__':
+    benchmark_union(int(sys.argv[1]) if len(sys.argv) > 1 else 10**6)
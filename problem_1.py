@@ -15,6 +15,19 @@ All operations must take O(1) time.
 For the current problem, you can consider the size of cache = 5.
 """
 import unittest
+import asyncio
+import contextlib
+import functools
+import gc
+import inspect
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from array import array
+from tempfile import TemporaryDirectory as TempDir
 
 
 class DoubleNode:
@@ -52,6 +65,8 @@ class DoublyLinkedList:
             previous.next = next
         if next:
             next.previous = previous
+        node.next = None
+        node.previous = None
 
     def prepend(self, key, value):
         """ Prepend a key and value to the beginning of the list
@@ -59,13 +74,16 @@ class DoublyLinkedList:
         Args:
             key: they key to use
             value: the value to use
+        Returns:
+            the new head node
         """
         if self.head is None:
             self.head = DoubleNode(key, value)
             self.tail = self.head
-            return
+            return self.head
         new_head = DoubleNode(key, value)
         self.prepend_node(new_head)
+        return new_head
 
     def prepend_node(self, node):
         """ Prepend a node to the beginning of the list
@@ -73,6 +91,10 @@ class DoublyLinkedList:
         Args:
             node (DoubleNode): the node to prepend to the beginning of the list
         """
+        if self.head is None:
+            self.head = node
+            self.tail = node
+            return
         self.head.previous = node
         node.next = self.head
         self.head = node
@@ -90,21 +112,776 @@ class DoublyLinkedList:
             node = node.next
         return out
 
+    def nodes(self):
+        """Return the nodes from head to tail
 
-class LRU_Cache(object):
+        Returns:
+            list of nodes
+        """
+        out = []
+        node = self.head
+        while node:
+            out.append(node)
+            node = node.next
+        return out
+
+    def bulk_load(self, keys, values):
+        """Fill an empty list in one go
+
+        Args:
+            keys (list): the keys, from head to tail
+            values (list): the values, from head to tail
+        Returns:
+            list of the new nodes, from head to tail
+        """
+        nodes = [DoubleNode(key, value) for key, value in zip(keys, values)]
+        for previous, next in zip(nodes, nodes[1:]):
+            previous.next = next
+            next.previous = previous
+        if nodes:
+            self.head = nodes[0]
+            self.tail = nodes[-1]
+        return nodes
+
+    def delete(self, node):
+        """Remove a node from the list for good
+
+        Args:
+            node (DoubleNode): the node to delete
+        """
+        self.remove_node(node)
+
+    def pop_tail(self):
+        """Remove the node at the tail of the list
+
+        Returns:
+            the key of the node that was removed
+        """
+        node = self.tail
+        self.remove_node(node)
+        return node.key
+
+    def move_to_head(self, node):
+        """Move an existing node to the beginning of the list
+
+        Args:
+            node (DoubleNode): the node to move
+        """
+        self.remove_node(node)
+        self.prepend_node(node)
+
+    def key_of(self, node):
+        return node.key
+
+    def value_of(self, node):
+        return node.value
+
+    def set_value(self, node, value):
+        node.value = value
+
+
+class ArrayLinkedList:
+    """Doubly-linked list stored in preallocated parallel arrays
+
+    Each entry lives in a numbered slot. The previous/next links are slot indices held in
+    array('l') objects rather than references between node objects, and removed slots go onto a
+    free-list so they can be reused. Nothing is allocated when an entry is added until all of
+    the preallocated slots are in use, at which point the arrays double in size.
+    """
     def __init__(self, capacity):
         """Initialise the class
 
         Args:
-            capacity (int): the size of the cache. Must be less than 2**16 (65,536)
+            capacity (int): the number of slots to preallocate
+        """
+        self.head = -1
+        self.tail = -1
+        self.keys = []
+        self.values = []
+        self.previous = array('l')
+        self.next = array('l')
+        # the free-list is threaded through the next array, starting at free_head
+        self.free_head = -1
+        self.grow(capacity)
+
+    def grow(self, count):
+        """Add more free slots
+
+        Args:
+            count (int): the number of slots to add
+        """
+        start = len(self.keys)
+        self.keys.extend([None] * count)
+        self.values.extend([None] * count)
+        self.previous.extend(array('l', [-1]) * count)
+        self.next.extend(range(start + 1, start + count + 1))
+        if count > 0:
+            self.next[-1] = self.free_head
+            self.free_head = start
+
+    def remove_node(self, slot):
+        """Unlink an existing slot from the list (the slot is not freed)
+
+        Args:
+            slot (int): the slot to remove
+        """
+        previous = self.previous[slot]
+        next = self.next[slot]
+        if self.tail == slot:
+            self.tail = previous
+        if self.head == slot:
+            self.head = next
+        if previous != -1:
+            self.next[previous] = next
+        if next != -1:
+            self.previous[next] = previous
+        self.next[slot] = -1
+        self.previous[slot] = -1
+
+    def prepend(self, key, value):
+        """Take a slot from the free-list and prepend it to the beginning of the list
+
+        Args:
+            key: the key to use
+            value: the value to use
+        Returns:
+            the slot used for the new head
+        """
+        if self.free_head == -1:
+            self.grow(max(len(self.keys), 1))
+        slot = self.free_head
+        self.free_head = self.next[slot]
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.next[slot] = -1
+        self.prepend_node(slot)
+        return slot
+
+    def prepend_node(self, slot):
+        """Prepend a slot to the beginning of the list
+
+        Args:
+            slot (int): the slot to prepend to the beginning of the list
+        """
+        if self.head == -1:
+            self.head = slot
+            self.tail = slot
+            return
+        self.previous[self.head] = slot
+        self.next[slot] = self.head
+        self.head = slot
+
+    def to_list(self):
+        """Return a list of the values in the linked list
+
+        Returns:
+            list of values
+        """
+        out = []
+        slot = self.head
+        while slot != -1:
+            out.append(self.values[slot])
+            slot = self.next[slot]
+        return out
+
+    def nodes(self):
+        """Return the slots from head to tail
+
+        Returns:
+            list of slots
+        """
+        out = []
+        slot = self.head
+        while slot != -1:
+            out.append(slot)
+            slot = self.next[slot]
+        return out
+
+    def bulk_load(self, keys, values):
+        """Fill an empty list in one go, using slots 0 to len(keys) - 1 in order
+
+        Args:
+            keys (list): the keys, from head to tail
+            values (list): the values, from head to tail
+        Returns:
+            range of the slots used, from head to tail
+        """
+        count = len(keys)
+        if count == 0:
+            return range(0)
+        if count > len(self.keys):
+            self.grow(count - len(self.keys))
+        self.keys[:count] = keys
+        self.values[:count] = values
+        self.previous[:count] = array('l', range(-1, count - 1))
+        self.next[:count] = array('l', range(1, count + 1))
+        self.next[count - 1] = -1
+        # whatever is left over becomes the free-list
+        spare = len(self.keys) - count
+        if spare:
+            self.next[count:] = array('l', range(count + 1, len(self.keys) + 1))
+            self.next[-1] = -1
+        self.free_head = count if spare else -1
+        self.head = 0
+        self.tail = count - 1
+        return range(count)
+
+    def delete(self, slot):
+        """Remove a slot from the list and put it back on the free-list
+
+        Args:
+            slot (int): the slot to delete
+        """
+        self.remove_node(slot)
+        self.keys[slot] = None
+        self.values[slot] = None
+        self.next[slot] = self.free_head
+        self.free_head = slot
+
+    def pop_tail(self):
+        """Remove the slot at the tail of the list and put it back on the free-list
+
+        Returns:
+            the key that was stored in the removed slot
+        """
+        slot = self.tail
+        key = self.keys[slot]
+        self.delete(slot)
+        return key
+
+    def move_to_head(self, slot):
+        """Move an existing slot to the beginning of the list
+
+        Args:
+            slot (int): the slot to move
+        """
+        self.remove_node(slot)
+        self.prepend_node(slot)
+
+    def key_of(self, slot):
+        return self.keys[slot]
+
+    def value_of(self, slot):
+        return self.values[slot]
+
+    def set_value(self, slot, value):
+        self.values[slot] = value
+
+
+class CountMinSketch:
+    """Approximate frequency counts for an unbounded set of keys in a fixed amount of memory
+
+    Each key increments one counter in each of four rows, and its estimated frequency is the
+    smallest of those counters. Counters saturate at 15, and once sample_size increments have
+    been recorded every counter is halved so that old popularity fades away.
+    """
+    max_count = 15
+    seeds = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, width):
+        """Initialise the class
+
+        Args:
+            width (int): the minimum number of counters per row (rounded up to a power of 2)
+        """
+        self.bits = max(width - 1, 1).bit_length()
+        self.rows = [array('B', [0]) * (1 << self.bits) for _ in self.seeds]
+        self.sample_size = 10 * (1 << self.bits)
+        self.additions = 0
+
+    def indexes(self, key):
+        """Work out the counter used by the key in each row
+
+        Args:
+            key: the key to look up
+        Returns:
+            list of counter indexes, one per row
+        """
+        h = hash(key) & 0xFFFFFFFF
+        shift = 32 - self.bits
+        seed_0, seed_1, seed_2, seed_3 = self.seeds
+        return (((h * seed_0) & 0xFFFFFFFF) >> shift, ((h * seed_1) & 0xFFFFFFFF) >> shift,
+                ((h * seed_2) & 0xFFFFFFFF) >> shift, ((h * seed_3) & 0xFFFFFFFF) >> shift)
+
+    def increment(self, key):
+        """Record one occurrence of the key
+
+        Args:
+            key: the key to count
+        """
+        for row, index in zip(self.rows, self.indexes(key)):
+            if row[index] < self.max_count:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.reset()
+
+    def estimate(self, key):
+        """Estimate how often the key has been seen
+
+        Args:
+            key: the key to look up
+        Returns:
+            the estimated frequency of the key
+        """
+        row_0, row_1, row_2, row_3 = self.rows
+        index_0, index_1, index_2, index_3 = self.indexes(key)
+        return min(row_0[index_0], row_1[index_1], row_2[index_2], row_3[index_3])
+
+    def reset(self):
+        """Halve every counter"""
+        for i, row in enumerate(self.rows):
+            self.rows[i] = array('B', [count >> 1 for count in row])
+        self.additions //= 2
+
+
+class WindowTinyLFUList:
+    """Window TinyLFU eviction policy with the same interface as DoublyLinkedList
+
+    New entries go into a small LRU window (1% of the capacity). The rest of the capacity is a
+    segmented LRU: entries leaving the window go onto a probation segment, and get promoted to a
+    protected segment (80% of the main space) when they are hit again. When something has to be
+    evicted, the entry at the tail of the window only takes the place of the entry at the tail of
+    probation if the frequency sketch says it has been used more often, so a one-off scan can't
+    push the frequently used entries out.
+    """
+    def __init__(self, capacity, sketch):
+        """Initialise the class
+
+        Args:
+            capacity (int): the maximum number of entries in the cache
+            sketch (CountMinSketch): frequency estimates used to decide which entries to admit
+        """
+        self.sketch = sketch
+        self.window_capacity = max(1, capacity // 100)
+        self.protected_capacity = (capacity - self.window_capacity) * 8 // 10
+        self.window = DoublyLinkedList()
+        self.probation = DoublyLinkedList()
+        self.protected = DoublyLinkedList()
+        self.segment_of = {}  # key -> the segment it is in
+        self.sizes = {self.window: 0, self.probation: 0, self.protected: 0}
+
+    def move_between_segments(self, node, segment):
+        """Move a node to the head of another segment
+
+        Args:
+            node (DoubleNode): the node to move
+            segment (DoublyLinkedList): the segment to move it to
+        """
+        current = self.segment_of[node.key]
+        current.remove_node(node)
+        self.sizes[current] -= 1
+        segment.prepend_node(node)
+        self.sizes[segment] += 1
+        self.segment_of[node.key] = segment
+
+    def prepend(self, key, value):
+        """Add a new entry to the head of the window
+
+        Args:
+            key: the key to use
+            value: the value to use
+        Returns:
+            the new node
+        """
+        node = self.window.prepend(key, value)
+        self.segment_of[key] = self.window
+        self.sizes[self.window] += 1
+        if self.sizes[self.window] > self.window_capacity:
+            # the cache has already made room, so the main segments have space for it
+            self.move_between_segments(self.window.tail, self.probation)
+        return node
+
+    def move_to_head(self, node):
+        """Record a hit on an entry
+
+        Args:
+            node (DoubleNode): the node that was hit
+        """
+        segment = self.segment_of[node.key]
+        if segment is self.probation:
+            self.move_between_segments(node, self.protected)
+            if self.sizes[self.protected] > self.protected_capacity:
+                self.move_between_segments(self.protected.tail, self.probation)
+        else:
+            segment.move_to_head(node)
+
+    def delete(self, node):
+        """Remove an entry for good
+
+        Args:
+            node (DoubleNode): the node to delete
+        """
+        segment = self.segment_of.pop(node.key)
+        segment.remove_node(node)
+        self.sizes[segment] -= 1
+
+    def pop_tail(self):
+        """Evict one entry
+
+        If the window is full, the tail of the window competes with the tail of the main
+        segments and the one with the lower estimated frequency is evicted. Otherwise the tail of
+        the main segments is evicted.
+
+        Returns:
+            the key of the entry that was evicted
+        """
+        victim = self.probation.tail or self.protected.tail
+        if self.sizes[self.window] >= self.window_capacity or victim is None:
+            candidate = self.window.tail
+            if victim is None:
+                victim = candidate
+            elif candidate is not None:
+                if self.sketch.estimate(candidate.key) > self.sketch.estimate(victim.key):
+                    self.move_between_segments(candidate, self.probation)
+                else:
+                    victim = candidate
+        self.delete(victim)
+        return victim.key
+
+    def to_list(self):
+        """Return a list of the values, window first, then protected, then probation
+
+        Returns:
+            list of values
+        """
+        return self.window.to_list() + self.protected.to_list() + self.probation.to_list()
+
+    def nodes(self):
+        """Return the nodes in the same order as to_list
+
+        Returns:
+            list of nodes
+        """
+        return self.window.nodes() + self.protected.nodes() + self.probation.nodes()
+
+    def key_of(self, node):
+        return node.key
+
+    def value_of(self, node):
+        return node.value
+
+    def set_value(self, node, value):
+        node.value = value
+
+
+# placeholder for a value that hasn't been read from the snapshot file yet
+NOT_LOADED = object()
+
+
+class Snapshot:
+    """A memory-mapped snapshot file written by LRU_Cache.save
+
+    The file holds a header, the keys pickled as one list, the remaining ttl of each entry
+    (optional), the offsets of the values and finally the values, each pickled on its own. The
+    entries are in recency order, most recently used first. Only the keys are unpickled when the
+    file is opened.
+    """
+    magic = b'LRUS'
+    header = struct.Struct('<4sBQQ')  # magic, flags, number of entries, size of the pickled keys
+    has_ttls = 1
+    no_ttl = float('nan')
+
+    def __init__(self, path):
+        """Open a snapshot file
+
+        Args:
+            path (str): the file to open
+        """
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, flags, count, keys_size = self.header.unpack_from(self.mm)
+        if magic != self.magic:
+            raise ValueError("not an LRU_Cache snapshot: {}".format(path))
+        position = self.header.size
+        self.keys = pickle.loads(self.mm[position:position + keys_size])
+        self.index_of = None  # key -> position in the file, built when it is first needed
+        position = self.align(position + keys_size)
+        view = memoryview(self.mm)
+        self.ttls = None
+        if flags & self.has_ttls:
+            self.ttls = view[position:position + 8 * count].cast('d')
+            position += 8 * count
+        self.offsets = view[position:position + 8 * (count + 1)].cast('Q')
+        self.values_start = position + 8 * (count + 1)
+
+    @staticmethod
+    def align(position):
+        return (position + 7) & ~7
+
+    @classmethod
+    def write(cls, path, keys, values, ttls=None):
+        """Write a snapshot file
+
+        Args:
+            path (str): the file to write
+            keys (list): the keys, most recently used first
+            values (list): the pickled values, as bytes
+            ttls (array): the remaining ttl of each entry (nan for none), or None
+        """
+        pickled_keys = pickle.dumps(keys, pickle.HIGHEST_PROTOCOL)
+        offsets = array('Q', [0])
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        temp_path = '{}.tmp'.format(path)
+        with open(temp_path, 'wb') as f:
+            f.write(cls.header.pack(cls.magic, cls.has_ttls if ttls is not None else 0, len(keys), len(pickled_keys)))
+            f.write(pickled_keys)
+            f.write(bytes(cls.align(f.tell()) - f.tell()))
+            if ttls is not None:
+                f.write(ttls.tobytes())
+            f.write(offsets.tobytes())
+            for value in values:
+                f.write(value)
+        os.replace(temp_path, path)
+
+    def index(self, key):
+        """Find the position of a key in the file
+
+        Args:
+            key: the key to look up
+        Returns:
+            the position of the entry
+        """
+        if self.index_of is None:
+            self.index_of = dict(zip(self.keys, range(len(self.keys))))
+        return self.index_of[key]
+
+    def raw_value(self, index):
+        """Return the pickled bytes of a value
+
+        Args:
+            index (int): position of the entry in the file
+        Returns:
+            bytes
+        """
+        return self.mm[self.values_start + self.offsets[index]:self.values_start + self.offsets[index + 1]]
+
+    def value(self, index):
+        """Unpickle a value
+
+        Args:
+            index (int): position of the entry in the file
+        Returns:
+            the value
+        """
+        return pickle.loads(self.raw_value(index))
+
+
+class TimerWheel:
+    """Hierarchical timer wheel
+
+    Level 0 has one bucket per tick, and each level above covers slots times as many ticks per
+    bucket. A key is scheduled into the lowest level whose range covers its expiry, and when the
+    wheel turns past the start of a higher level bucket its keys are cascaded down to the levels
+    below. Scheduling, cancelling and firing a key are all O(1) (O(levels) amortized including
+    the cascades).
+    """
+    def __init__(self, tick, now, slots=64, levels=4):
+        """Initialise the class
+
+        Args:
+            tick (float): the time covered by one level 0 bucket
+            now (float): the current time
+            slots (int): the number of buckets per level. Must be a power of 2
+            levels (int): the number of levels
         """
-        max_capacity = 2**16
-        if capacity >= max_capacity:
-            raise ValueError("capacity must be less than {}".format(max_capacity))
+        if tick <= 0:
+            raise ValueError("tick must be greater than 0")
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError("slots must be a power of 2")
+        self.tick = tick
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.max_delta = slots ** levels - 1
+        self.buckets = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.due = {}  # keys whose time has come but haven't been handed out yet
+        self.location = {}  # key -> the bucket it is in
+        self.current_tick = int(now / tick)
+
+    def __len__(self):
+        return len(self.location)
+
+    def schedule(self, key, when):
+        """Schedule a key to fire at the given time, replacing any earlier schedule for it
+
+        Args:
+            key: the key to schedule
+            when (float): the time the key should fire
+        """
+        self.schedule_tick(key, -int(-when // self.tick))  # round up so the key never fires early
+
+    def schedule_tick(self, key, expire_tick):
+        """Schedule a key to fire on the given tick, replacing any earlier schedule for it
+
+        Args:
+            key: the key to schedule
+            expire_tick (int): the tick the key should fire on
+        """
+        self.cancel(key)
+        delta = min(expire_tick - self.current_tick, self.max_delta)
+        if delta <= 0:
+            bucket = self.due
+        else:
+            expire_tick = self.current_tick + delta
+            level = 0
+            while delta >> (self.bits * (level + 1)):
+                level += 1
+            bucket = self.buckets[level][(expire_tick >> (self.bits * level)) & self.mask]
+        bucket[key] = expire_tick
+        self.location[key] = bucket
+
+    def cancel(self, key):
+        """Remove a key from the wheel if it is scheduled
+
+        Args:
+            key: the key to remove
+        """
+        bucket = self.location.pop(key, None)
+        if bucket is not None:
+            del bucket[key]
+
+    def cascade(self, level):
+        """Move the keys in the current bucket of a level down to the levels below
+
+        Args:
+            level (int): the level to cascade
+        """
+        index = (self.current_tick >> (self.bits * level)) & self.mask
+        bucket = self.buckets[level][index]
+        self.buckets[level][index] = {}
+        for key, expire_tick in bucket.items():
+            del self.location[key]
+            self.schedule_tick(key, expire_tick)
+
+    def next_event_tick(self, target_tick):
+        """Return the first tick after the current one on which a key fires or is cascaded
+
+        Args:
+            target_tick (int): the tick to stop at if nothing happens before it
+        Returns:
+            int
+        """
+        event_tick = target_tick
+        for level in range(self.levels):
+            buckets = self.buckets[level]
+            if not any(buckets):
+                continue
+            shift = self.bits * level
+            position = self.current_tick >> shift
+            for step in range(1, self.mask + 2):
+                if buckets[(position + step) & self.mask]:
+                    event_tick = min(event_tick, (position + step) << shift)
+                    break
+        return event_tick
+
+    def advance(self, now, max_keys):
+        """Turn the wheel up to the given time and return the keys that have fired
+
+        Ticks on which nothing fires or cascades are skipped, so catching up after a quiet period
+        costs no more than the keys it moves. At most max_keys keys are returned, anything left
+        over is handed out by the next call.
+
+        Args:
+            now (float): the current time
+            max_keys (int): the maximum number of keys to return
+        Returns:
+            list of keys
+        """
+        target_tick = int(now / self.tick)
+        while self.current_tick < target_tick and len(self.due) < max_keys:
+            if len(self.location) == len(self.due):
+                # nothing left on the wheel itself
+                self.current_tick = target_tick
+                break
+            self.current_tick = self.next_event_tick(target_tick)
+            # cascade from the highest level whose bucket boundary we have just crossed
+            level = 0
+            while level + 1 < self.levels and (self.current_tick >> (self.bits * level)) & self.mask == 0:
+                level += 1
+            for cascade_level in range(level, 0, -1):
+                self.cascade(cascade_level)
+            index = self.current_tick & self.mask
+            bucket = self.buckets[0][index]
+            if bucket:
+                self.buckets[0][index] = {}
+                for key in bucket:
+                    self.due[key] = bucket[key]
+                    self.location[key] = self.due
+        fired = []
+        while self.due and len(fired) < max_keys:
+            key = next(iter(self.due))
+            self.cancel(key)
+            fired.append(key)
+        return fired
+
+
+class LRU_Cache(object):
+    # the array backend preallocates up to this many slots and grows beyond it on demand
+    max_preallocated_slots = 2**16
+    # resolution (in clock units) of the timer wheel that reclaims expired entries
+    ttl_tick = 0.1
+    # the most expired entries reclaimed by one get/set
+    max_expired_per_operation = 16
+
+    def __init__(self, capacity, backend='linked', weigher=None, max_weight=None, clock=time.monotonic,
+                 policy='lru'):
+        """Initialise the class
+
+        Args:
+            capacity (int): the maximum number of entries in the cache
+            backend (str): 'linked' stores each entry in its own DoubleNode, 'array' stores
+                the entries in preallocated slots of an ArrayLinkedList
+            weigher (callable): optional weigher(key, value) returning the weight of an entry,
+                e.g. its size in bytes
+            max_weight (int): the maximum total weight of the entries. Required with a weigher
+            clock (callable): returns the current time, used for the time-to-live of entries
+            policy (str): 'lru' evicts the least recently used entry, 'tinylfu' uses a
+                WindowTinyLFUList so that scans don't push out frequently used entries.
+                'tinylfu' only works with the 'linked' backend
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if (weigher is None) != (max_weight is None):
+            raise ValueError("weigher and max_weight must be given together")
+        if max_weight is not None and max_weight < 0:
+            raise ValueError("max_weight cannot be negative")
+        if backend not in ('linked', 'array'):
+            raise ValueError("unknown backend: {}".format(backend))
+        if policy not in ('lru', 'tinylfu'):
+            raise ValueError("unknown policy: {}".format(policy))
+        if policy == 'tinylfu' and backend != 'linked':
+            raise ValueError("the tinylfu policy needs the linked backend")
         self.capacity = capacity
+        self.backend = backend
+        self.policy = policy
+        self.weigher = weigher
+        self.max_weight = max_weight
+        self.clock = clock
+        self.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def clear(self):
+        """Remove every entry from the cache (the counters are kept)"""
         self.hash_map = {}
-        self.access_list = DoublyLinkedList()
+        self.sketch = None  # frequency estimates, only used by the 'tinylfu' policy
+        if self.policy == 'tinylfu':
+            self.sketch = CountMinSketch(self.capacity)
+            self.access_list = WindowTinyLFUList(self.capacity, self.sketch)
+        elif self.backend == 'linked':
+            self.access_list = DoublyLinkedList()
+        else:
+            self.access_list = ArrayLinkedList(min(self.capacity, self.max_preallocated_slots))
         self.cache_size = 0
+        self.weights = {}  # only used with a weigher
+        self.total_weight = 0
+        self.expires = {}  # key -> expiry time, only for entries set with a ttl
+        self.timer_wheel = None  # created when the first ttl is used
+        self.snapshot = None  # the Snapshot that values not loaded yet are read from
 
     def get(self, key):
         """Retrieve an item using the provided key
@@ -114,51 +891,619 @@ class LRU_Cache(object):
         Returns:
             -1 if the key isn't in the cache, otherwise returns the value for the given key.
         """
+        if self.expires:
+            now = self.clock()
+            self.expire_entries(now)
+            if key in self.expires and self.expires[key] <= now:
+                self.delete(key)
+                self.expirations += 1
+        if self.sketch is not None:
+            self.sketch.increment(key)
         if key not in self.hash_map:
+            self.misses += 1
             return -1
+        self.hits += 1
         node = self.hash_map[key]
         # move this item to the top of the access list
         self.move_node_to_head(node)
-        return node.value
+        value = self.access_list.value_of(node)
+        if value is NOT_LOADED:
+            value = self.load_value(node)
+        return value
+
+    def load_value(self, node):
+        """Read a value that hasn't been loaded from the snapshot yet and store it in the cache
+
+        Args:
+            node: the node (or slot) of the entry
+        Returns:
+            the value
+        """
+        value = self.snapshot.value(self.snapshot.index(self.access_list.key_of(node)))
+        self.access_list.set_value(node, value)
+        return value
+
+    def get_many(self, keys):
+        """Retrieve several items in one call
+
+        The result is the same as calling get for each key in turn, but the expired entries are
+        only reclaimed once for the whole batch.
+
+        Args:
+            keys: iterable of keys to look up
+        Returns:
+            list of values in the same order as the keys, with -1 for each key that isn't in the cache
+        """
+        now = None
+        if self.expires:
+            now = self.clock()
+            self.expire_entries(now)
+        hash_map = self.hash_map
+        expires = self.expires
+        sketch = self.sketch
+        move_to_head = self.access_list.move_to_head
+        value_of = self.access_list.value_of
+        out = []
+        hits = 0
+        for key in keys:
+            if expires and key in expires and expires[key] <= now:
+                self.delete(key)
+                self.expirations += 1
+            if sketch is not None:
+                sketch.increment(key)
+            node = hash_map.get(key)
+            if node is None:
+                out.append(-1)
+                continue
+            hits += 1
+            move_to_head(node)
+            value = value_of(node)
+            if value is NOT_LOADED:
+                value = self.load_value(node)
+            out.append(value)
+        self.hits += hits
+        self.misses += len(out) - hits
+        return out
+
+    def stats(self):
+        """Return the hit/miss/eviction counters
+
+        Returns:
+            dict of counters
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': self.cache_size,
+        }
 
     def move_node_to_head(self, node):
         """move the node to the head
 
         Args:
-            node (DoubleNode): the node to move to the head of the list
+            node: the node (or slot) to move to the head of the list
+        """
+        self.access_list.move_to_head(node)
+
+    def forget(self, key):
+        """Update the bookkeeping for an entry that has just been removed from the access list
+
+        Args:
+            key: key of the removed entry
         """
-        self.access_list.remove_node(node)
-        self.access_list.prepend_node(node)
+        self.hash_map.pop(key)
+        self.cache_size -= 1
+        if self.weigher:
+            self.total_weight -= self.weights.pop(key)
+        if key in self.expires:
+            del self.expires[key]
+            self.timer_wheel.cancel(key)
+
+    def evict(self):
+        """Remove the least recently used entry - i.e. the one at the tail"""
+        self.forget(self.access_list.pop_tail())
+        self.evictions += 1
+
+    def delete(self, key):
+        """Remove an entry from the cache if it is present
+
+        Args:
+            key: key of the entry to remove
+        """
+        if key not in self.hash_map:
+            return
+        self.access_list.delete(self.hash_map[key])
+        self.forget(key)
+
+    def expire_entries(self, now=None):
+        """Reclaim entries whose time-to-live has run out
 
-    def set(self, key, value):
+        The timer wheel does a bounded amount of work per call, so get/set can call this every
+        time without their cost depending on how many entries have a ttl.
+
+        Args:
+            now (float): the current time, defaults to calling the clock
+        """
+        if self.timer_wheel is None:
+            return
+        if now is None:
+            now = self.clock()
+        for key in self.timer_wheel.advance(now, self.max_expired_per_operation):
+            if self.expires[key] <= now:
+                # the wheel has already dropped the key, so there's nothing to cancel
+                del self.expires[key]
+                self.delete(key)
+                self.expirations += 1
+            else:
+                # the expiry was further away than the wheel can reach - schedule it again
+                self.timer_wheel.schedule(key, self.expires[key])
+
+    def set(self, key, value, ttl=None):
         """Set the value in the cache.
 
          If the key is not present in the cache it creates it.
-         If the cache is at capacity it removes the oldest item.
+         If the cache is at capacity, or adding the entry would take the total weight over
+         max_weight, it removes the oldest items until the new entry fits. An entry that is
+         heavier than max_weight on its own is not cached.
 
          Args:
              key: key to use (cannot be None)
              value: value to use (cannot be None)
+             ttl (float): optional time-to-live of the entry, in clock units
          """
         if key is None:
             raise ValueError("key value cannot be None")
         if value is None:
             raise ValueError("value cannot be None")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if self.expires:
+            self.expire_entries()
+        weight = 0
+        if self.weigher:
+            weight = self.weigher(key, value)
+            if weight > self.max_weight:
+                self.delete(key)
+                return
         if key in self.hash_map:
             # move it to the top of the access list?
             node = self.hash_map[key]
-            node.value = value
+            self.access_list.set_value(node, value)
             self.move_node_to_head(node)
+            if self.weigher:
+                self.total_weight += weight - self.weights[key]
+                self.weights[key] = weight
+                while self.total_weight > self.max_weight:
+                    self.evict()
+        else:
+            if self.sketch is not None:
+                self.sketch.increment(key)
+            while self.cache_size >= self.capacity or (self.weigher and self.total_weight + weight > self.max_weight):
+                self.evict()
+            # add the value to the head
+            self.hash_map[key] = self.access_list.prepend(key, value)
+            self.cache_size += 1
+            if self.weigher:
+                self.weights[key] = weight
+                self.total_weight += weight
+        if key in self.hash_map:
+            # with the tinylfu policy the entry can lose out to the others while making room
+            self.set_ttl(key, ttl)
+
+    def set_many(self, items, ttl=None):
+        """Set several values in one call
+
+        The result is the same as calling set for each pair in turn, but the expired entries are
+        only reclaimed once for the whole batch and the evictions and prepends are done in the
+        same pass.
+
+        Args:
+            items: dict or iterable of (key, value) pairs
+            ttl (float): optional time-to-live for all of the entries
+        """
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if isinstance(items, dict):
+            items = items.items()
+        if self.expires:
+            self.expire_entries()
+        hash_map = self.hash_map
+        expires = self.expires
+        sketch = self.sketch
+        weigher = self.weigher
+        weights = self.weights
+        max_weight = self.max_weight
+        capacity = self.capacity
+        prepend = self.access_list.prepend
+        move_to_head = self.access_list.move_to_head
+        set_value = self.access_list.set_value
+        pop_tail = self.access_list.pop_tail
+        forget = self.forget
+        evictions = 0
+        for key, value in items:
+            if key is None:
+                raise ValueError("key value cannot be None")
+            if value is None:
+                raise ValueError("value cannot be None")
+            weight = 0
+            if weigher:
+                weight = weigher(key, value)
+                if weight > max_weight:
+                    self.delete(key)
+                    continue
+            node = hash_map.get(key)
+            if node is not None:
+                set_value(node, value)
+                move_to_head(node)
+                if weigher:
+                    self.total_weight += weight - weights[key]
+                    weights[key] = weight
+                    while self.total_weight > max_weight:
+                        forget(pop_tail())
+                        evictions += 1
+            else:
+                if sketch is not None:
+                    sketch.increment(key)
+                while self.cache_size >= capacity or (weigher and self.total_weight + weight > max_weight):
+                    forget(pop_tail())
+                    evictions += 1
+                hash_map[key] = prepend(key, value)
+                self.cache_size += 1
+                if weigher:
+                    weights[key] = weight
+                    self.total_weight += weight
+            if (ttl is not None or key in expires) and key in hash_map:
+                self.set_ttl(key, ttl)
+        self.evictions += evictions
+
+    def items(self):
+        """Return the entries from the most to the least recently used
+
+        Returns:
+            list of (key, value) pairs
+        """
+        out = []
+        for node in self.access_list.nodes():
+            value = self.access_list.value_of(node)
+            if value is NOT_LOADED:
+                value = self.load_value(node)
+            out.append((self.access_list.key_of(node), value))
+        return out
+
+    def save(self, path):
+        """Write the entries to a snapshot file, most recently used first
+
+        Values that haven't been loaded from a previous snapshot are copied across without being
+        unpickled. Entries with a ttl are saved with the time they have left. The file is written
+        next to path and then renamed, so a snapshot that is being read is never overwritten.
+
+        Args:
+            path (str): the file to write
+        """
+        now = self.clock() if self.expires else None
+        keys = []
+        values = []
+        ttls = array('d')
+        for node in self.access_list.nodes():
+            key = self.access_list.key_of(node)
+            value = self.access_list.value_of(node)
+            keys.append(key)
+            if value is NOT_LOADED:
+                values.append(self.snapshot.raw_value(self.snapshot.index(key)))
+            else:
+                values.append(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            ttls.append(self.expires[key] - now if key in self.expires else Snapshot.no_ttl)
+        Snapshot.write(path, keys, values, ttls if self.expires else None)
+
+    def load(self, path):
+        """Replace the entries with the ones in a snapshot file
+
+        The file is memory-mapped and only the keys are read up front. Each value is unpickled
+        the first time it is used (or straight away if the cache has a weigher, which needs the
+        value). If the snapshot holds more entries than the capacity, the least recently used
+        ones are left out. The garbage collector is paused while the entries are rebuilt, which
+        more than halves the time the linked backend takes to load a large snapshot.
+
+        Args:
+            path (str): the file to read
+        """
+        snapshot = Snapshot(path)
+        self.clear()
+        count = min(len(snapshot.keys), self.capacity)
+        keys = snapshot.keys[:count]
+        # the linked backend allocates a node per entry, and the garbage collector would
+        # otherwise scan the growing list of nodes again and again while they are created
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if self.weigher:
+                for index in range(count - 1, -1, -1):
+                    self.set(keys[index], snapshot.value(index))
+            elif self.policy == 'lru':
+                handles = self.access_list.bulk_load(keys, [NOT_LOADED] * count)
+                self.hash_map = dict(zip(keys, handles))
+                self.cache_size = len(self.hash_map)
+                if isinstance(handles, range):
+                    # the array backend puts entry i in slot i, so the hash map already is the index
+                    snapshot.index_of = self.hash_map.copy()
+            else:
+                for index in range(count - 1, -1, -1):
+                    self.set(keys[index], NOT_LOADED)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self.snapshot = snapshot
+        if snapshot.ttls is not None:
+            for index, key in enumerate(keys):
+                ttl = snapshot.ttls[index]
+                if ttl == ttl and key in self.hash_map:  # nan means no ttl
+                    if ttl > 0:
+                        self.set_ttl(key, ttl)
+                    else:
+                        self.delete(key)
+
+    def set_ttl(self, key, ttl):
+        """Set or clear the expiry time of an entry
+
+        Args:
+            key: key of the entry
+            ttl (float): time-to-live in clock units, or None for no expiry
+        """
+        if ttl is None:
+            if key in self.expires:
+                del self.expires[key]
+                self.timer_wheel.cancel(key)
             return
-        if self.cache_size == self.capacity:
-            # remove the least recently used entry - i.e. the one at the tail
-            node = self.access_list.tail
-            self.hash_map.pop(node.key)
-            self.access_list.remove_node(node)
-        # add the value to the head
-        self.access_list.prepend(key, value)
-        self.hash_map[key] = self.access_list.head
-        self.cache_size += 1
+        now = self.clock()
+        if self.timer_wheel is None:
+            self.timer_wheel = TimerWheel(self.ttl_tick, now)
+        elif not self.timer_wheel:
+            # the wheel isn't turned while nothing is scheduled, so bring it up to date first
+            self.timer_wheel.advance(now, 1)
+        self.expires[key] = now + ttl
+        self.timer_wheel.schedule(key, now + ttl)
+
+
+class Sharded_LRU_Cache(object):
+    def __init__(self, capacity, num_shards=16, backend='linked', weigher=None, max_weight=None,
+                 clock=time.monotonic, policy='lru'):
+        """Initialise the class
+
+        The keys are spread over num_shards independent LRU_Cache segments using the hash of the key.
+        Each segment has its own lock and gets an equal share of the capacity, so threads working
+        on keys in different segments don't have to wait for each other.
+
+        Args:
+            capacity (int): the total size of the cache
+            num_shards (int): the number of independent segments to use
+            backend (str): storage backend for each segment - see LRU_Cache
+            weigher (callable): optional weigher(key, value) - see LRU_Cache
+            max_weight (int): the total weight budget, split evenly between the segments
+            clock (callable): returns the current time - see LRU_Cache
+            policy (str): eviction policy for each segment - see LRU_Cache
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        if capacity < num_shards:
+            raise ValueError("capacity must be at least num_shards ({})".format(num_shards))
+        self.capacity = capacity
+        self.num_shards = num_shards
+        # split the capacity as evenly as possible - the first few shards take the remainder
+        shard_capacity, remainder = divmod(capacity, num_shards)
+        shard_weights = [None] * num_shards
+        if max_weight is not None:
+            shard_weight, weight_remainder = divmod(max_weight, num_shards)
+            shard_weights = [shard_weight + (1 if i < weight_remainder else 0) for i in range(num_shards)]
+        self.shards = [LRU_Cache(shard_capacity + (1 if i < remainder else 0), backend, weigher, shard_weights[i],
+                                 clock, policy)
+                       for i in range(num_shards)]
+        self.locks = [threading.Lock() for _ in range(num_shards)]
+
+    def shard_index(self, key):
+        """Work out which shard a key belongs to
+
+        Args:
+            key: the key to look up
+        Returns:
+            index of the shard that owns the key
+        """
+        return hash(key) % self.num_shards
+
+    def get(self, key):
+        """Retrieve an item using the provided key
+
+        Args:
+            key: key to use to lookup the value
+        Returns:
+            -1 if the key isn't in the cache, otherwise returns the value for the given key.
+        """
+        index = self.shard_index(key)
+        with self.locks[index]:
+            return self.shards[index].get(key)
+
+    def set(self, key, value, ttl=None):
+        """Set the value in the cache.
+
+        Only the shard that owns the key is locked while the value is set.
+
+        Args:
+            key: key to use (cannot be None)
+            value: value to use (cannot be None)
+            ttl (float): optional time-to-live of the entry - see LRU_Cache
+        """
+        index = self.shard_index(key)
+        with self.locks[index]:
+            self.shards[index].set(key, value, ttl)
+
+    def get_many(self, keys):
+        """Retrieve several items, locking each shard once
+
+        Args:
+            keys: iterable of keys to look up
+        Returns:
+            list of values in the same order as the keys, with -1 for each key that isn't in the cache
+        """
+        keys = list(keys)
+        positions = {}  # shard index -> positions of its keys
+        for position, key in enumerate(keys):
+            positions.setdefault(self.shard_index(key), []).append(position)
+        out = [-1] * len(keys)
+        for index, shard_positions in positions.items():
+            with self.locks[index]:
+                values = self.shards[index].get_many([keys[position] for position in shard_positions])
+            for position, value in zip(shard_positions, values):
+                out[position] = value
+        return out
+
+    def set_many(self, items, ttl=None):
+        """Set several values, locking each shard once
+
+        Args:
+            items: dict or iterable of (key, value) pairs
+            ttl (float): optional time-to-live for all of the entries
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        by_shard = {}
+        for key, value in items:
+            by_shard.setdefault(self.shard_index(key), []).append((key, value))
+        for index, shard_items in by_shard.items():
+            with self.locks[index]:
+                self.shards[index].set_many(shard_items, ttl)
+
+    def stats(self):
+        """Return the hit/miss/eviction counters added up over all of the shards
+
+        Returns:
+            dict of counters
+        """
+        totals = {}
+        for index, shard in enumerate(self.shards):
+            with self.locks[index]:
+                for name, count in shard.stats().items():
+                    totals[name] = totals.get(name, 0) + count
+        return totals
+
+
+# the number of locks lru_memoize spreads the in-flight calls of a function over
+MEMOIZE_STRIPES = 64
+# separates the positional arguments from the keyword arguments in a memoize key - an object no
+# caller can pass, so f(None, a=1) and f(None, None, ('a', 1)) get different keys
+KWARGS_MARK = object()
+
+
+class InFlightCall:
+    """A call that one thread is computing and other threads are waiting for"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def lru_memoize(cache=None, capacity=128):
+    """Decorator that caches the results of a function in an LRU cache
+
+    The cache key is made from the positional and keyword arguments, which must be hashable.
+    When several callers miss on the same key at the same time only the first one calls the
+    function and the rest wait for its result. Exceptions are passed on to every waiting caller
+    and are not cached. Coroutine functions get the same treatment, with the call running as a
+    task of its own so that a caller that is cancelled doesn't take the others with it.
+
+    The cache is available as the cache attribute of the decorated function, so stats() can be
+    used to tune the capacity.
+
+    Args:
+        cache: an LRU_Cache or Sharded_LRU_Cache to use, by default a new LRU_Cache
+        capacity (int): the capacity of the new LRU_Cache if no cache is given
+    Returns:
+        the decorator
+    """
+    if cache is None:
+        cache = LRU_Cache(capacity)
+
+    def make_key(args, kwargs):
+        if kwargs:
+            return args + (KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+        return args
+
+    def decorator(func):
+        # results are boxed in a 1-tuple so that None and -1 can be cached too
+        if inspect.iscoroutinefunction(func):
+            in_flight = {}  # key -> asyncio.Task
+
+            async def compute(key, args, kwargs):
+                try:
+                    result = await func(*args, **kwargs)
+                    cache.set(key, (result,))
+                    return result
+                finally:
+                    del in_flight[key]
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                boxed = cache.get(key)
+                if boxed != -1:
+                    return boxed[0]
+                task = in_flight.get(key)
+                if task is None:
+                    # the call runs as a task of its own, so cancelling one caller (e.g. with
+                    # asyncio.wait_for) doesn't cancel it for the others
+                    task = asyncio.ensure_future(compute(key, args, kwargs))
+                    in_flight[key] = task
+                return await asyncio.shield(task)
+
+            async_wrapper.cache = cache
+            return async_wrapper
+
+        if isinstance(cache, Sharded_LRU_Cache):
+            cache_lock = contextlib.nullcontext()  # each shard has a lock of its own
+        else:
+            cache_lock = threading.Lock()
+        # the in-flight calls are spread over several locks by key, so that callers of different
+        # keys don't wait for each other
+        stripes = [(threading.Lock(), {}) for _ in range(MEMOIZE_STRIPES)]  # (lock, key -> InFlightCall)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            lock, in_flight = stripes[hash(key) % MEMOIZE_STRIPES]
+            with lock:
+                with cache_lock:
+                    boxed = cache.get(key)
+                if boxed != -1:
+                    return boxed[0]
+                call = in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = InFlightCall()
+                    in_flight[key] = call
+            if not leader:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            try:
+                call.result = func(*args, **kwargs)
+            except BaseException as error:
+                call.error = error
+                raise
+            else:
+                with lock:
+                    with cache_lock:
+                        cache.set(key, (call.result,))
+                return call.result
+            finally:
+                with lock:
+                    del in_flight[key]
+                call.done.set()
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
 
 
 class LRUCacheTestCase(unittest.TestCase):
@@ -174,7 +1519,16 @@ class LRUCacheTestCase(unittest.TestCase):
 
     def test_invalid_capacity(self):
         with self.assertRaises(ValueError):
-            our_cache = LRU_Cache(2 ** 17)
+            our_cache = LRU_Cache(0)
+
+    def test_large_capacity(self):
+        for backend in ('linked', 'array'):
+            our_cache = LRU_Cache(2 ** 17, backend)
+            for i in range(2 ** 17 + 10):
+                our_cache.set(i, i)
+            self.assertEqual(our_cache.cache_size, 2 ** 17)
+            self.assertEqual(our_cache.get(9), -1)
+            self.assertEqual(our_cache.get(10), 10)
 
     def test_valid_data(self):
         our_cache = LRU_Cache(5)
@@ -205,6 +1559,626 @@ class LRUCacheTestCase(unittest.TestCase):
         # cache recently used list: [6, 5, 2, 1, 4]
         self.assertEqual(our_cache.get(3), -1)  # the cache reached it's capacity and 3 was the least recently used entry
 
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            LRU_Cache(5, backend='unknown')
+
+    def test_size_stays_at_capacity(self):
+        our_cache = LRU_Cache(3)
+        for i in range(10):
+            our_cache.set(i, i)
+        self.assertEqual(our_cache.cache_size, 3)
+        self.assertEqual(our_cache.access_list.to_list(), [9, 8, 7])
+
+
+class WeightedLRUCacheTestCase(unittest.TestCase):
+    def weigher(self, key, value):
+        return len(value)
+
+    def test_weigher_requires_max_weight(self):
+        with self.assertRaises(ValueError):
+            LRU_Cache(5, weigher=self.weigher)
+        with self.assertRaises(ValueError):
+            LRU_Cache(5, max_weight=10)
+
+    def test_evicts_until_weight_fits(self):
+        for backend in ('linked', 'array'):
+            our_cache = LRU_Cache(100, backend, weigher=self.weigher, max_weight=10)
+            our_cache.set(1, 'aaa')
+            our_cache.set(2, 'bbb')
+            our_cache.set(3, 'ccc')
+            self.assertEqual(our_cache.total_weight, 9)
+            # needs 6 - both 1 and 2 have to go
+            our_cache.set(4, 'dddddd')
+            self.assertEqual(our_cache.access_list.to_list(), ['dddddd', 'ccc'])
+            self.assertEqual(our_cache.total_weight, 9)
+            self.assertEqual(our_cache.cache_size, 2)
+            self.assertEqual(our_cache.get(1), -1)
+            self.assertEqual(our_cache.get(2), -1)
+
+    def test_update_changes_weight(self):
+        our_cache = LRU_Cache(100, weigher=self.weigher, max_weight=10)
+        our_cache.set(1, 'aaa')
+        our_cache.set(2, 'bbb')
+        our_cache.set(2, 'bbbbbbbb')
+        self.assertEqual(our_cache.get(1), -1)
+        self.assertEqual(our_cache.get(2), 'bbbbbbbb')
+        self.assertEqual(our_cache.total_weight, 8)
+
+    def test_too_heavy_entry_is_not_cached(self):
+        our_cache = LRU_Cache(100, weigher=self.weigher, max_weight=4)
+        our_cache.set(1, 'aa')
+        our_cache.set(1, 'aaaaa')
+        our_cache.set(2, 'bbbbb')
+        self.assertEqual(our_cache.get(1), -1)
+        self.assertEqual(our_cache.get(2), -1)
+        self.assertEqual(our_cache.total_weight, 0)
+        self.assertEqual(our_cache.cache_size, 0)
+
+    def test_sharded_weight_budget(self):
+        our_cache = Sharded_LRU_Cache(100, num_shards=4, weigher=self.weigher, max_weight=10)
+        self.assertEqual([3, 3, 2, 2], [shard.max_weight for shard in our_cache.shards])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TimerWheelTestCase(unittest.TestCase):
+    def test_keys_fire_on_their_tick(self):
+        wheel = TimerWheel(1, 0, slots=4, levels=3)
+        expected = {}
+        for key in range(60):
+            when = (key * 7) % 60 + 1
+            wheel.schedule(key, when)
+            expected.setdefault(when, set()).add(key)
+        for now in range(1, 61):
+            fired = wheel.advance(now, 1000)
+            self.assertEqual(set(fired), expected.get(now, set()))
+        self.assertEqual(len(wheel), 0)
+
+    def test_cancel(self):
+        wheel = TimerWheel(1, 0, slots=4, levels=2)
+        wheel.schedule('a', 5)
+        wheel.cancel('a')
+        self.assertEqual(wheel.advance(10, 10), [])
+        self.assertEqual(len(wheel), 0)
+
+    def test_work_is_bounded(self):
+        wheel = TimerWheel(1, 0)
+        for key in range(10):
+            wheel.schedule(key, 1)
+        self.assertEqual(len(wheel.advance(5, 4)), 4)
+        self.assertEqual(len(wheel.advance(5, 4)), 4)
+        self.assertEqual(len(wheel.advance(5, 4)), 2)
+
+    def test_far_future_key_fires_at_wheel_range(self):
+        wheel = TimerWheel(1, 0, slots=4, levels=2)
+        wheel.schedule('a', 100)
+        self.assertEqual(wheel.advance(14, 10), [])
+        self.assertEqual(wheel.advance(15, 10), ['a'])
+
+    def test_quiet_ticks_are_skipped(self):
+        wheel = TimerWheel(1, 0)
+        wheel.schedule('a', 10**7)
+        wheel.schedule('b', 10**7 + 5)
+        self.assertEqual(wheel.advance(10**7 - 1, 1), [])
+        self.assertEqual(wheel.advance(10**7 + 10, 1), ['a'])
+        self.assertEqual(wheel.advance(10**7 + 10, 1), ['b'])
+        self.assertEqual(wheel.advance(10**7 + 10, 1), [])
+        self.assertEqual(wheel.current_tick, 10**7 + 10)
+        # an empty wheel jumps straight to the time it is given
+        self.assertEqual(wheel.advance(10**9, 1), [])
+        self.assertEqual(wheel.current_tick, 10**9)
+
+
+class TTLLRUCacheTestCase(unittest.TestCase):
+    def test_invalid_ttl(self):
+        our_cache = LRU_Cache(5)
+        with self.assertRaises(ValueError):
+            our_cache.set(1, 1, ttl=0)
+
+    def test_expired_entry_is_a_miss(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(5, clock=clock)
+        our_cache.set(1, 'a', ttl=10)
+        our_cache.set(2, 'b')
+        clock.now = 9.5
+        self.assertEqual(our_cache.get(1), 'a')
+        clock.now = 10
+        self.assertEqual(our_cache.get(1), -1)
+        self.assertEqual(our_cache.get(2), 'b')
+        self.assertEqual(our_cache.cache_size, 1)
+
+    def test_unread_entries_are_reclaimed(self):
+        for backend in ('linked', 'array'):
+            clock = FakeClock()
+            our_cache = LRU_Cache(100, backend, clock=clock)
+            for i in range(50):
+                our_cache.set(i, i, ttl=5)
+            our_cache.set('keep', 1)
+            clock.now = 6
+            # every operation reclaims a bounded number of entries
+            while our_cache.cache_size > 1:
+                our_cache.get('keep')
+            self.assertEqual(our_cache.access_list.to_list(), [1])
+            self.assertEqual(len(our_cache.expires), 0)
+            self.assertEqual(len(our_cache.timer_wheel), 0)
+
+    def test_entries_are_reclaimed_after_a_quiet_period(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(200, clock=clock)
+        our_cache.set('warm', 1, ttl=1)
+        clock.now = 10 * 3600
+        self.assertEqual(our_cache.get('warm'), -1)
+        for i in range(100):
+            our_cache.set(i, i, ttl=1)
+        clock.now += 2
+        for _ in range(100 // our_cache.max_expired_per_operation + 1):
+            our_cache.get('missing')
+        self.assertEqual(our_cache.cache_size, 0)
+        self.assertEqual(len(our_cache.timer_wheel), 0)
+
+    def test_set_without_ttl_clears_expiry(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(5, clock=clock)
+        our_cache.set(1, 'a', ttl=1)
+        our_cache.set(1, 'b')
+        clock.now = 100
+        self.assertEqual(our_cache.get(1), 'b')
+
+    def test_eviction_cancels_timer(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(2, clock=clock)
+        our_cache.set(1, 'a', ttl=1)
+        our_cache.set(2, 'b', ttl=1)
+        our_cache.set(3, 'c', ttl=1)
+        self.assertEqual(len(our_cache.timer_wheel), 2)
+        self.assertNotIn(1, our_cache.expires)
+
+    def test_sharded_ttl(self):
+        clock = FakeClock()
+        our_cache = Sharded_LRU_Cache(8, num_shards=2, clock=clock)
+        our_cache.set(1, 'a', ttl=1)
+        clock.now = 2
+        self.assertEqual(our_cache.get(1), -1)
+
+
+class CountMinSketchTestCase(unittest.TestCase):
+    def test_estimate(self):
+        sketch = CountMinSketch(64)
+        for _ in range(5):
+            sketch.increment('a')
+        sketch.increment('b')
+        self.assertEqual(sketch.estimate('a'), 5)
+        self.assertGreaterEqual(sketch.estimate('b'), 1)
+
+    def test_counters_saturate(self):
+        sketch = CountMinSketch(1024)
+        for _ in range(100):
+            sketch.increment('a')
+        self.assertEqual(sketch.estimate('a'), CountMinSketch.max_count)
+
+    def test_reset_halves_counts(self):
+        sketch = CountMinSketch(64)
+        for _ in range(6):
+            sketch.increment('a')
+        sketch.reset()
+        self.assertEqual(sketch.estimate('a'), 3)
+
+
+class TinyLFUCacheTestCase(unittest.TestCase):
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            LRU_Cache(5, policy='unknown')
+
+    def test_tinylfu_needs_linked_backend(self):
+        with self.assertRaises(ValueError):
+            LRU_Cache(5, backend='array', policy='tinylfu')
+
+    def test_valid_data(self):
+        our_cache = LRU_Cache(5, policy='tinylfu')
+        for i in range(5):
+            our_cache.set(i, i * 10)
+        for i in range(5):
+            self.assertEqual(our_cache.get(i), i * 10)
+        our_cache.set(2, 'two')
+        self.assertEqual(our_cache.get(2), 'two')
+        our_cache.set(5, 50)
+        self.assertEqual(our_cache.cache_size, 5)
+        self.assertEqual(len(our_cache.access_list.to_list()), 5)
+
+    def test_scan_resistance(self):
+        lru_cache = LRU_Cache(100)
+        tinylfu_cache = LRU_Cache(100, policy='tinylfu')
+        for our_cache in (lru_cache, tinylfu_cache):
+            for _ in range(5):
+                for key in range(50):
+                    if our_cache.get(key) == -1:
+                        our_cache.set(key, key)
+            for key in range(1000, 3000):
+                if our_cache.get(key) == -1:
+                    our_cache.set(key, key)
+        self.assertEqual(sum(lru_cache.get(key) != -1 for key in range(50)), 0)
+        self.assertGreaterEqual(sum(tinylfu_cache.get(key) != -1 for key in range(50)), 45)
+
+    def test_delete_and_ttl(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(10, clock=clock, policy='tinylfu')
+        our_cache.set(1, 'a', ttl=1)
+        our_cache.set(2, 'b')
+        clock.now = 2
+        self.assertEqual(our_cache.get(1), -1)
+        self.assertEqual(our_cache.get(2), 'b')
+        self.assertEqual(our_cache.access_list.to_list(), ['b'])
+
+
+class BatchAndStatsTestCase(unittest.TestCase):
+    def test_get_many(self):
+        our_cache = LRU_Cache(5)
+        our_cache.set_many({1: 'a', 2: 'b', 3: 'c'})
+        self.assertEqual(our_cache.get_many([3, 9, 1]), ['c', -1, 'a'])
+        self.assertEqual(our_cache.access_list.to_list(), ['a', 'c', 'b'])
+
+    def test_set_many(self):
+        our_cache = LRU_Cache(2)
+        our_cache.set_many([(1, 'a'), (2, 'b'), (3, 'c')])
+        self.assertEqual(our_cache.access_list.to_list(), ['c', 'b'])
+
+    def test_set_many_matches_set(self):
+        for policy in ('lru', 'tinylfu'):
+            for weigher in (None, lambda key, value: len(value)):
+                max_weight = 12 if weigher else None
+                one_by_one = LRU_Cache(4, weigher=weigher, max_weight=max_weight, policy=policy)
+                batched = LRU_Cache(4, weigher=weigher, max_weight=max_weight, policy=policy)
+                items = [(i % 7, 'x' * (i % 5 + 1)) for i in range(30)]
+                for key, value in items:
+                    one_by_one.set(key, value)
+                batched.set_many(items)
+                self.assertEqual(batched.items(), one_by_one.items())
+                self.assertEqual(batched.stats(), one_by_one.stats())
+                self.assertEqual(batched.total_weight, one_by_one.total_weight)
+
+    def test_set_many_with_ttl(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(5, clock=clock)
+        our_cache.set_many({1: 'a', 2: 'b'}, ttl=1)
+        our_cache.set(3, 'c')
+        clock.now = 1
+        self.assertEqual(our_cache.get_many([1, 2, 3]), [-1, -1, 'c'])
+
+    def test_stats(self):
+        our_cache = LRU_Cache(2)
+        our_cache.set(1, 'a')
+        our_cache.set(2, 'b')
+        our_cache.set(3, 'c')
+        our_cache.get(1)
+        our_cache.get(3)
+        our_cache.get_many([2, 3, 4])
+        stats = our_cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['size'], 2)
+
+    def test_sharded_batch(self):
+        our_cache = Sharded_LRU_Cache(16, num_shards=4)
+        our_cache.set_many({i: i * 2 for i in range(10)})
+        self.assertEqual(our_cache.get_many([9, 3, 100, 0]), [18, 6, -1, 0])
+        stats = our_cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 10)
+
+
+class MemoizeTestCase(unittest.TestCase):
+    def test_results_are_cached(self):
+        calls = []
+
+        @lru_memoize(capacity=10)
+        def square(x, offset=0):
+            calls.append(x)
+            return x * x + offset
+
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3, offset=1), 10)
+        self.assertEqual(calls, [3, 3])
+        self.assertEqual(square.cache.stats()['hits'], 1)
+
+    def test_keyword_arguments_get_their_own_key(self):
+        @lru_memoize()
+        def func(*args, **kwargs):
+            return args, kwargs
+
+        self.assertEqual(func(None, a=1), ((None,), {'a': 1}))
+        self.assertEqual(func(None, None, ('a', 1)), ((None, None, ('a', 1)), {}))
+        self.assertEqual(func(None, a=1), ((None,), {'a': 1}))
+
+    def test_none_and_minus_one_are_cached(self):
+        calls = []
+
+        @lru_memoize()
+        def func(x):
+            calls.append(x)
+            return None if x else -1
+
+        for _ in range(2):
+            self.assertIsNone(func(True))
+            self.assertEqual(func(False), -1)
+        self.assertEqual(len(calls), 2)
+
+    def test_exceptions_are_not_cached(self):
+        calls = []
+
+        @lru_memoize()
+        def fail(x):
+            calls.append(x)
+            raise KeyError(x)
+
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                fail(1)
+        self.assertEqual(len(calls), 2)
+
+    def test_concurrent_misses_are_coalesced(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @lru_memoize(cache=Sharded_LRU_Cache(16, num_shards=4))
+        def slow(x):
+            calls.append(x)
+            started.set()
+            release.wait()
+            return x + 1
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(1))) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [2] * 5)
+        self.assertEqual(calls, [1])
+
+    def test_async_misses_are_coalesced(self):
+        calls = []
+
+        @lru_memoize()
+        async def slow(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        async def main():
+            return await asyncio.gather(*[slow(4) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(main()), [8] * 5)
+        self.assertEqual(asyncio.run(slow(4)), 8)
+        self.assertEqual(calls, [4])
+
+    def test_async_cancelled_caller_does_not_cancel_the_others(self):
+        calls = []
+
+        @lru_memoize()
+        async def slow(x):
+            calls.append(x)
+            await asyncio.sleep(0.05)
+            return x * 2
+
+        async def main():
+            impatient = asyncio.ensure_future(asyncio.wait_for(slow(4), 0.01))
+            await asyncio.sleep(0)
+            patient = asyncio.ensure_future(slow(4))
+            with self.assertRaises(asyncio.TimeoutError):
+                await impatient
+            return await patient
+
+        self.assertEqual(asyncio.run(main()), 8)
+        self.assertEqual(calls, [4])
+
+    def test_async_exceptions_reach_every_caller(self):
+        @lru_memoize()
+        async def fail(x):
+            await asyncio.sleep(0.01)
+            raise KeyError(x)
+
+        async def main():
+            return await asyncio.gather(*[fail(1) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(result, KeyError) for result in results))
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = TempDir()
+        self.path = os.path.join(self.directory.name, 'cache.snapshot')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip_keeps_recency_order(self):
+        for backend in ('linked', 'array'):
+            our_cache = LRU_Cache(10, backend)
+            for i in range(15):
+                our_cache.set(i, {'value': i})
+            our_cache.get(7)
+            our_cache.get(12)
+            our_cache.save(self.path)
+            restored = LRU_Cache(10, backend)
+            restored.load(self.path)
+            self.assertEqual(restored.items(), our_cache.items())
+            self.assertEqual(restored.cache_size, 10)
+            # the least recently used entry is still the first to go
+            restored.set('new', 1)
+            self.assertEqual(restored.get(5), -1)
+            self.assertEqual(restored.get(6), {'value': 6})
+
+    def test_values_are_loaded_lazily(self):
+        our_cache = LRU_Cache(5, 'array')
+        our_cache.set('a', [1, 2])
+        our_cache.set('b', 'x')
+        our_cache.save(self.path)
+        restored = LRU_Cache(5, 'array')
+        restored.load(self.path)
+        self.assertTrue(all(value is NOT_LOADED for value in restored.access_list.to_list()))
+        self.assertEqual(restored.get_many(['a', 'c']), [[1, 2], -1])
+        self.assertEqual(restored.access_list.to_list()[0], [1, 2])
+        self.assertIs(restored.access_list.to_list()[1], NOT_LOADED)
+
+    def test_resave_lazily_loaded_cache(self):
+        our_cache = LRU_Cache(5)
+        our_cache.set_many([(1, 'a'), (2, 'b'), (3, 'c')])
+        our_cache.save(self.path)
+        restored = LRU_Cache(5)
+        restored.load(self.path)
+        restored.get(1)
+        restored.save(self.path)
+        again = LRU_Cache(5)
+        again.load(self.path)
+        self.assertEqual(again.items(), [(1, 'a'), (3, 'c'), (2, 'b')])
+
+    def test_smaller_capacity_keeps_most_recent(self):
+        our_cache = LRU_Cache(10)
+        for i in range(10):
+            our_cache.set(i, i)
+        our_cache.save(self.path)
+        for policy in ('lru', 'tinylfu'):
+            restored = LRU_Cache(3, policy=policy)
+            restored.load(self.path)
+            self.assertEqual(sorted(restored.hash_map), [7, 8, 9])
+
+    def test_weighted_load(self):
+        our_cache = LRU_Cache(10)
+        our_cache.set_many([(1, 'aaa'), (2, 'bbb'), (3, 'ccc')])
+        our_cache.save(self.path)
+        restored = LRU_Cache(10, weigher=lambda key, value: len(value), max_weight=6)
+        restored.load(self.path)
+        self.assertEqual(restored.items(), [(3, 'ccc'), (2, 'bbb')])
+        self.assertEqual(restored.total_weight, 6)
+
+    def test_ttls_are_saved(self):
+        clock = FakeClock()
+        our_cache = LRU_Cache(5, clock=clock)
+        our_cache.set(1, 'a', ttl=10)
+        our_cache.set(2, 'b', ttl=2)
+        our_cache.set(3, 'c')
+        clock.now = 4
+        our_cache.save(self.path)
+        restored_clock = FakeClock()
+        restored = LRU_Cache(5, clock=restored_clock)
+        restored.load(self.path)
+        self.assertEqual(sorted(restored.hash_map), [1, 3])
+        restored_clock.now = 5.9
+        self.assertEqual(restored.get(1), 'a')
+        restored_clock.now = 6
+        self.assertEqual(restored.get(1), -1)
+        self.assertEqual(restored.get(3), 'c')
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(bytes(64))
+        with self.assertRaises(ValueError):
+            LRU_Cache(5).load(self.path)
+
+
+class ArrayLRUCacheTestCase(unittest.TestCase):
+    def test_valid_data(self):
+        our_cache = LRU_Cache(5, backend='array')
+        for i in range(1, 5):
+            our_cache.set(i, i)
+        self.assertEqual(our_cache.access_list.to_list(), [4, 3, 2, 1])
+        self.assertEqual(our_cache.get(1), 1)
+        self.assertEqual(our_cache.get(2), 2)
+        self.assertEqual(our_cache.access_list.to_list(), [2, 1, 4, 3])
+        self.assertEqual(our_cache.get(9), -1)
+        our_cache.set(5, 5)
+        our_cache.set(6, 6)
+        self.assertEqual(our_cache.access_list.to_list(), [6, 5, 2, 1, 4])
+        self.assertEqual(our_cache.get(3), -1)
+
+    def test_update_existing_key(self):
+        our_cache = LRU_Cache(2, backend='array')
+        our_cache.set('a', 1)
+        our_cache.set('b', 2)
+        our_cache.set('a', 3)
+        self.assertEqual(our_cache.access_list.to_list(), [3, 2])
+
+    def test_evicted_slot_is_reused(self):
+        our_cache = LRU_Cache(2, backend='array')
+        our_cache.set('a', 1)
+        our_cache.set('b', 2)
+        slot = our_cache.hash_map['a']
+        our_cache.set('c', 3)
+        self.assertEqual(our_cache.hash_map['c'], slot)
+        self.assertEqual(our_cache.get('a'), -1)
+
+    def test_many_evictions(self):
+        our_cache = LRU_Cache(4, backend='array')
+        for i in range(100):
+            our_cache.set(i, i)
+            self.assertEqual(our_cache.get(i), i)
+        self.assertEqual(our_cache.access_list.to_list(), [99, 98, 97, 96])
+
+
+class ShardedLRUCacheTestCase(unittest.TestCase):
+    def test_invalid_shards(self):
+        with self.assertRaises(ValueError):
+            Sharded_LRU_Cache(5, num_shards=0)
+
+    def test_capacity_smaller_than_shards(self):
+        with self.assertRaises(ValueError):
+            Sharded_LRU_Cache(3, num_shards=4)
+
+    def test_capacity_split(self):
+        our_cache = Sharded_LRU_Cache(10, num_shards=4)
+        self.assertEqual([3, 3, 2, 2], [shard.capacity for shard in our_cache.shards])
+
+    def test_valid_data(self):
+        our_cache = Sharded_LRU_Cache(8, num_shards=4)
+        for i in range(8):
+            our_cache.set(i, i * 10)
+        for i in range(8):
+            self.assertEqual(our_cache.get(i), i * 10)
+        self.assertEqual(our_cache.get(99), -1)
+
+    def test_eviction_is_per_shard(self):
+        our_cache = Sharded_LRU_Cache(4, num_shards=4)
+        # small ints hash to themselves so 0 and 4 land in the same shard
+        our_cache.set(0, 'a')
+        our_cache.set(1, 'b')
+        our_cache.set(4, 'c')
+        self.assertEqual(our_cache.get(0), -1)
+        self.assertEqual(our_cache.get(1), 'b')
+        self.assertEqual(our_cache.get(4), 'c')
+
+    def test_threaded_access(self):
+        our_cache = Sharded_LRU_Cache(64, num_shards=4)
+
+        def worker(offset):
+            for i in range(1000):
+                key = (offset + i) % 64
+                our_cache.set(key, key)
+                our_cache.get(key)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for key in range(64):
+            self.assertEqual(our_cache.get(key), key)
+
 
 if __name__ == '__main__':
     unittest.main()
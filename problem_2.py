@@ -6,10 +6,18 @@ that end with ".c"
 """
 import unittest
 from tempfile import TemporaryDirectory as TempDir
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import functools
 import os
+import pickle
+import queue
+import re
+import threading
+import time
 
 
-def find_files(suffix, path):
+def find_files(suffix, path, workers=1, sort=False):
     """
     Find all files beneath path with file name suffix.
 
@@ -21,26 +29,437 @@ def find_files(suffix, path):
     Args:
       suffix(str): suffix if the file name to be found
       path(str): path of the file system
+      workers(int): number of threads listing directories at the same time
+      sort(bool): return the paths sorted rather than in the order they were found
 
     Returns:
-       a list of paths
+       a flat list of paths, or None if no files were found
+    """
+    paths = list(iter_find_files(suffix, path, workers, sort))
+    return paths if len(paths) > 0 else None
+
+
+def iter_find_files(suffix, path, workers=1, sort=False):
+    """
+    Generator version of find_files - yields each matching path as soon as it is found.
+
+    The arguments are checked straight away rather than when the first path is requested.
+
+    Args:
+      suffix(str): suffix if the file name to be found
+      path(str): path of the file system
+      workers(int): number of threads listing directories at the same time
+      sort(bool): yield the paths sorted. Nothing is yielded until the walk has finished
+
+    Returns:
+       a generator of paths
     """
     if suffix is None or len(suffix) == 0:
         raise ValueError("suffix cannot be None or empty")
     if not os.path.isdir(path):
         raise ValueError("input path is not a directory: {}".format(path))
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    scan = functools.partial(scan_directory, suffix)
+    if workers == 1:
+        paths = walk_files(scan, path)
+    else:
+        paths = parallel_walk_files(scan, path, workers)
+    return iter(sorted(paths)) if sort else paths
+
+
+def scan_directory(suffix, directory):
+    """
+    List one directory.
+
+    Args:
+      suffix(str): suffix if the file name to be found
+      directory(str): the directory to list
+
+    Returns:
+       tuple of (matching file paths, subdirectory paths). Both are empty if the directory
+       can't be read
+    """
     paths = []
-    files = os.listdir(path)
-    for file in files:
-        full_path = os.path.join(path, file)
-        if os.path.isfile(full_path):
-            if file.endswith(suffix):
-                paths.append(full_path)
-        if os.path.isdir(full_path):
-            ret = find_files(suffix, full_path)
-            if ret:
-                paths.append(ret)
-    return paths if len(paths) > 0 else None
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.endswith(suffix) and entry.is_file():
+                    paths.append(entry.path)
+    except OSError:
+        return [], []
+    return paths, subdirectories
+
+
+def walk_files(scan, path):
+    """
+    Walk the directory tree with an explicit stack instead of recursion.
+
+    os.scandir returns the type of each entry along with its name, so there is no extra stat
+    call per entry. Symbolic links to directories are not followed, so link cycles can't make
+    the walk go on forever, and directories that can't be read are skipped.
+
+    Args:
+      scan(callable): lists one directory, e.g. scan_directory with the suffix filled in.
+        Returns a tuple of (results, subdirectory paths)
+      path(str): the directory to start from
+
+    Returns:
+       a generator of results
+    """
+    stack = [path]
+    while stack:
+        paths, subdirectories = scan(stack.pop())
+        yield from paths
+        # push in reverse so the subdirectories are visited in the order they were listed
+        stack.extend(reversed(subdirectories))
+
+
+def parallel_walk_files(scan, path, workers):
+    """
+    Walk the directory tree with a pool of threads.
+
+    Each directory is listed by a task on the pool, which submits a new task for each of its
+    subdirectories. os.scandir releases the GIL while it waits on the file system, so on slow
+    (e.g. network) file systems the listings overlap. The matching paths come back through a
+    queue and are yielded as soon as each directory has been listed, in no particular order.
+
+    Args:
+      scan(callable): lists one directory - see walk_files
+      path(str): the directory to start from
+      workers(int): number of threads
+
+    Returns:
+       a generator of results
+    """
+    results = queue.Queue()
+    lock = threading.Lock()
+    pending = [1]  # directories submitted but not finished yet
+    stopped = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def visit(directory):
+        if stopped.is_set():
+            return
+        try:
+            paths, subdirectories = scan(directory)
+            with lock:
+                pending[0] += len(subdirectories)
+            for subdirectory in subdirectories:
+                pool.submit(visit, subdirectory)
+            results.put(paths)
+            with lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                results.put(None)
+        except BaseException as error:
+            results.put(error)
+
+    pool.submit(visit, path)
+    try:
+        while True:
+            item = results.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield from item
+    finally:
+        # also runs if the caller stops early, so the remaining tasks don't keep walking
+        stopped.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PatternMatcher(object):
+    """
+    Matches file names against many suffixes and glob patterns, and directory names against
+    exclusion patterns, with the patterns compiled once up front.
+
+    The suffixes are kept in one set per suffix length, so checking a name costs one slice and
+    set lookup per distinct length rather than one endswith per suffix. The glob patterns are
+    combined into a single regular expression that rejects most names with one match, and only
+    the names it accepts are checked against each glob to find all the patterns they match.
+    """
+    glob_characters = re.compile(r'[*?\[]')
+
+    def __init__(self, patterns, exclude=None):
+        """
+        Args:
+          patterns(iterable): suffixes (e.g. '.c') and glob patterns (e.g. 'test_*.py') to match
+            file names against
+          exclude(iterable): glob patterns for the names of directories not to descend into
+        """
+        self.patterns = list(dict.fromkeys(patterns))
+        if len(self.patterns) == 0:
+            raise ValueError("patterns cannot be empty")
+        if any(pattern is None or len(pattern) == 0 for pattern in self.patterns):
+            raise ValueError("patterns cannot be None or empty")
+        self.suffixes = {}  # suffix length -> {suffix -> pattern}
+        self.globs = []  # (pattern, compiled regular expression)
+        for pattern in self.patterns:
+            if self.glob_characters.search(pattern):
+                self.globs.append((pattern, re.compile(fnmatch.translate(pattern))))
+            else:
+                self.suffixes.setdefault(len(pattern), {})[pattern] = pattern
+        self.suffix_lengths = sorted(self.suffixes)
+        self.any_glob = self.compile_globs(pattern for pattern, _ in self.globs)
+        self.excluded = self.compile_globs(exclude or ())
+
+    @staticmethod
+    def compile_globs(patterns):
+        """
+        Returns:
+           one compiled regular expression matching any of the glob patterns, or None if there are none
+        """
+        patterns = list(patterns)
+        if len(patterns) == 0:
+            return None
+        return re.compile('|'.join('(?:{})'.format(fnmatch.translate(pattern)) for pattern in patterns))
+
+    def match(self, name):
+        """
+        Find all the patterns a file name matches.
+
+        Args:
+          name(str): the file name
+
+        Returns:
+           list of patterns
+        """
+        matched = []
+        for length in self.suffix_lengths:
+            pattern = self.suffixes[length].get(name[-length:])
+            if pattern is not None:
+                matched.append(pattern)
+        if self.any_glob is not None and self.any_glob.match(name):
+            matched.extend(pattern for pattern, regex in self.globs if regex.match(name))
+        return matched
+
+    def scan(self, directory):
+        """
+        List one directory.
+
+        Args:
+          directory(str): the directory to list
+
+        Returns:
+           tuple of ((pattern, path) pairs, subdirectory paths that aren't excluded). Both are empty
+           if the directory can't be read
+        """
+        matches = []
+        subdirectories = []
+        excluded = self.excluded
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if excluded is None or not excluded.match(entry.name):
+                            subdirectories.append(entry.path)
+                    else:
+                        patterns = self.match(entry.name)
+                        if patterns and entry.is_file():
+                            matches.extend((pattern, entry.path) for pattern in patterns)
+        except OSError:
+            return [], []
+        return matches, subdirectories
+
+
+def find_files_multi(patterns, path, exclude=None, workers=1, sort=False):
+    """
+    Find the files beneath path matching any of several suffixes or glob patterns in one walk.
+
+    Directories whose names match one of the exclude patterns (e.g. '.git', 'node_modules')
+    are not descended into at all.
+
+    Args:
+      patterns(iterable): suffixes (e.g. '.c') and glob patterns (e.g. 'test_*.py')
+      path(str): path of the file system
+      exclude(iterable): glob patterns for the names of directories to skip
+      workers(int): number of threads listing directories at the same time
+      sort(bool): sort the paths found for each pattern
+
+    Returns:
+       dict of pattern -> list of paths. A file that matches several patterns is listed under each
+    """
+    matcher = PatternMatcher(patterns, exclude)
+    if not os.path.isdir(path):
+        raise ValueError("input path is not a directory: {}".format(path))
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if workers == 1:
+        matches = walk_files(matcher.scan, path)
+    else:
+        matches = parallel_walk_files(matcher.scan, path, workers)
+    grouped = {pattern: [] for pattern in matcher.patterns}
+    for pattern, file_path in matches:
+        grouped[pattern].append(file_path)
+    if sort:
+        for paths in grouped.values():
+            paths.sort()
+    return grouped
+
+
+class FileIndex(object):
+    """
+    An index of the files beneath a directory that is brought up to date incrementally.
+
+    For every directory the index keeps its modification time along with the names of its files
+    and subdirectories. Adding, removing or renaming an entry changes the modification time of
+    the directory it is in, so refresh() only has to stat each directory and list the ones
+    whose modification time has changed. The paths are also grouped by extension, so repeated
+    find_files queries for an extension don't have to look at every file.
+
+    The index can be saved to a file and loaded again by a later FileIndex.
+    """
+    # directories modified this recently (in nanoseconds) are listed again on the next refresh,
+    # since a change made in the same clock tick as the listing wouldn't change the mtime
+    racy_window_ns = 2 * 10**9
+
+    def __init__(self, path, index_path=None):
+        """
+        Args:
+          path(str): the directory to index
+          index_path(str): optional file the index is saved to and loaded from
+        """
+        if not os.path.isdir(path):
+            raise ValueError("input path is not a directory: {}".format(path))
+        self.path = path
+        self.index_path = index_path
+        self.directories = {}  # directory -> (mtime, file names, subdirectory names)
+        self.by_extension = {}  # extension -> {directory -> paths}
+        if index_path is not None and os.path.exists(index_path):
+            self.load()
+
+    @staticmethod
+    def extension(name):
+        """
+        Return everything from the last '.' in a file name, or None if there isn't one.
+
+        A file name ends with a suffix like '.c' (that has no other '.') exactly when its
+        extension is that suffix, which is what lets find_files use by_extension.
+        """
+        position = name.rfind('.')
+        return name[position:] if position >= 0 else None
+
+    def add_to_extensions(self, directory, names):
+        for name in names:
+            extension = self.extension(name)
+            if extension is not None:
+                paths = self.by_extension.setdefault(extension, {}).setdefault(directory, [])
+                paths.append(os.path.join(directory, name))
+
+    def remove_from_extensions(self, directory, names):
+        # each extension only once - the first name removes the directory's whole list
+        for extension in {self.extension(name) for name in names} - {None}:
+            directories = self.by_extension.get(extension)
+            if directories is None:
+                continue
+            directories.pop(directory, None)
+            if not directories:
+                del self.by_extension[extension]
+
+    @staticmethod
+    def list_directory(directory):
+        """
+        Returns:
+           tuple of (file names, subdirectory names). Both are empty if the directory can't be read
+        """
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except OSError:
+            return [], []
+        return files, subdirectories
+
+    def refresh(self):
+        """
+        Bring the index up to date with the file system.
+
+        Returns:
+           the number of directories that had to be listed again
+        """
+        old_directories = self.directories
+        directories = {}
+        listed = 0
+        racy_after = time.time_ns() - self.racy_window_ns
+        stack = [self.path]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            entry = old_directories.get(directory)
+            if entry is None or entry[0] != mtime:
+                files, subdirectories = self.list_directory(directory)
+                if entry is not None:
+                    self.remove_from_extensions(directory, entry[1])
+                self.add_to_extensions(directory, files)
+                listed += 1
+                # None never matches, so a directory that may change again this tick is listed next time too
+                entry = (mtime if mtime < racy_after else None, files, subdirectories)
+            directories[directory] = entry
+            stack.extend(os.path.join(directory, name) for name in reversed(entry[2]))
+        for directory in old_directories.keys() - directories.keys():
+            self.remove_from_extensions(directory, old_directories[directory][1])
+        self.directories = directories
+        return listed
+
+    def find_files(self, suffix, refresh=True, sort=False):
+        """
+        Find all files beneath the indexed directory with file name suffix.
+
+        Args:
+          suffix(str): suffix if the file name to be found
+          refresh(bool): bring the index up to date first
+          sort(bool): return the paths sorted
+
+        Returns:
+           a flat list of paths, or None if no files were found
+        """
+        if suffix is None or len(suffix) == 0:
+            raise ValueError("suffix cannot be None or empty")
+        if refresh:
+            self.refresh()
+        if suffix.rfind('.') == 0:
+            paths = [path for paths in self.by_extension.get(suffix, {}).values() for path in paths]
+        else:
+            paths = [os.path.join(directory, name)
+                     for directory, (_, files, _) in self.directories.items()
+                     for name in files if name.endswith(suffix)]
+        if sort:
+            paths.sort()
+        return paths if len(paths) > 0 else None
+
+    def save(self):
+        """Write the index to index_path"""
+        if self.index_path is None:
+            raise ValueError("the index has no index_path to save to")
+        temp_path = '{}.tmp'.format(self.index_path)
+        with open(temp_path, 'wb') as f:
+            pickle.dump((self.path, self.directories), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.index_path)
+
+    def load(self):
+        """Read the index from index_path. The index isn't used if it was made for another directory"""
+        with open(self.index_path, 'rb') as f:
+            path, directories = pickle.load(f)
+        if path != self.path:
+            return
+        self.directories = directories
+        self.by_extension = {}
+        for directory, (_, files, _) in directories.items():
+            self.add_to_extensions(directory, files)
 
 
 class FindFilesTestCase(unittest.TestCase):
@@ -59,6 +478,65 @@ class FindFilesTestCase(unittest.TestCase):
         self.assertEqual(len(ret), 1)
         print(ret)
 
+    def test_results_are_flat(self):
+        ret = find_files(suffix=".c", path=self.directory.name)
+        self.assertEqual(ret, [os.path.join(self.directory.name, "sub", "test.c")])
+
+    def test_no_matches(self):
+        self.assertIsNone(find_files(suffix=".cpp", path=self.directory.name))
+
+    def test_iter_find_files(self):
+        found = iter_find_files(suffix=".h", path=self.directory.name)
+        self.assertEqual(next(found), os.path.join(self.directory.name, 'test.h'))
+        self.assertEqual(list(found), [])
+
+    def test_iter_find_files_checks_arguments_straight_away(self):
+        with self.assertRaises(ValueError):
+            iter_find_files(suffix=".c", path="!invalid path!")
+
+    def test_parallel_search(self):
+        with TempDir() as directory:
+            expected = []
+            for i in range(5):
+                sub_path = os.path.join(directory, 'sub{}'.format(i), 'inner')
+                os.makedirs(sub_path)
+                for name in ('a.c', 'b.c', 'c.h'):
+                    with open(os.path.join(sub_path, name), 'w') as f:
+                        f.write("/* {} */\n".format(name))
+                expected += [os.path.join(sub_path, 'a.c'), os.path.join(sub_path, 'b.c')]
+            ret = find_files(suffix=".c", path=directory, workers=4)
+            self.assertEqual(sorted(ret), sorted(expected))
+            self.assertEqual(find_files(suffix=".c", path=directory, workers=4, sort=True), sorted(expected))
+            self.assertEqual(find_files(suffix=".c", path=directory, sort=True), sorted(expected))
+
+    def test_parallel_search_can_stop_early(self):
+        found = iter_find_files(suffix=".c", path=self.directory.name, workers=2)
+        self.assertEqual(next(found), os.path.join(self.directory.name, "sub", "test.c"))
+        found.close()
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            find_files(suffix=".c", path=self.directory.name, workers=0)
+
+    def test_deep_nesting(self):
+        with TempDir() as directory:
+            # deeper than the default recursion limit (os.makedirs is recursive, so build it by hand)
+            deep_paths = []
+            deep_path = directory
+            for _ in range(1200):
+                deep_path = os.path.join(deep_path, 'd')
+                os.mkdir(deep_path)
+                deep_paths.append(deep_path)
+            with open(os.path.join(deep_path, 'deep.c'), 'w') as f:
+                f.write("/* deep.c */\n")
+            try:
+                self.assertEqual(find_files(suffix=".c", path=directory), [os.path.join(deep_path, 'deep.c')])
+            finally:
+                # shutil.rmtree is recursive too, so tidy up by hand
+                os.remove(os.path.join(deep_path, 'deep.c'))
+                for deep_path in reversed(deep_paths):
+                    os.rmdir(deep_path)
+
     def test_invalid_path(self):
         with self.assertRaises(ValueError):
             find_files(suffix=".dat", path="!invalid path!")
@@ -68,5 +546,153 @@ class FindFilesTestCase(unittest.TestCase):
             find_files(suffix='', path=self.directory.name)
 
 
+class FindFilesMultiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = TempDir()
+        self.root = self.directory.name
+        for sub in ('src', '.git', 'node_modules', os.path.join('src', 'node_modules')):
+            os.mkdir(os.path.join(self.root, sub))
+        for name in ('main.c', 'main.h', 'util.cpp', 'test_main.py', 'setup.py',
+                     os.path.join('src', 'lib.c'), os.path.join('src', 'test_lib.py'),
+                     os.path.join('.git', 'hook.c'), os.path.join('node_modules', 'dep.c'),
+                     os.path.join('src', 'node_modules', 'dep.h')):
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write("/* {} */\n".format(name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_suffixes_and_globs(self):
+        found = find_files_multi(['.c', '.h', '.cpp', 'test_*.py'], self.root, sort=True)
+        self.assertEqual(found['.c'], sorted([self.path('main.c'), self.path('src', 'lib.c'),
+                                              self.path('.git', 'hook.c'), self.path('node_modules', 'dep.c')]))
+        self.assertEqual(found['.cpp'], [self.path('util.cpp')])
+        self.assertEqual(found['test_*.py'], sorted([self.path('test_main.py'), self.path('src', 'test_lib.py')]))
+
+    def test_exclusions(self):
+        found = find_files_multi(['.c', '.h'], self.root, exclude=['.git', 'node_*'], sort=True)
+        self.assertEqual(found['.c'], [self.path('main.c'), self.path('src', 'lib.c')])
+        self.assertEqual(found['.h'], [self.path('main.h')])
+
+    def test_file_matching_several_patterns(self):
+        found = find_files_multi(['.py', 'test_*', '*.py', 'n.c'], self.root, exclude=['src'])
+        self.assertEqual(found['.py'], found['*.py'])
+        self.assertEqual(sorted(found['.py']), [self.path('setup.py'), self.path('test_main.py')])
+        self.assertEqual(found['test_*'], [self.path('test_main.py')])
+        self.assertEqual(found['n.c'], [self.path('main.c')])
+
+    def test_parallel(self):
+        serial = find_files_multi(['.c', 'test_*.py'], self.root, exclude=['.git'], sort=True)
+        parallel = find_files_multi(['.c', 'test_*.py'], self.root, exclude=['.git'], workers=4, sort=True)
+        self.assertEqual(serial, parallel)
+
+    def test_no_matches(self):
+        self.assertEqual(find_files_multi(['.rs'], self.root), {'.rs': []})
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            find_files_multi([], self.root)
+        with self.assertRaises(ValueError):
+            find_files_multi(['.c', ''], self.root)
+        with self.assertRaises(ValueError):
+            find_files_multi(['.c'], "!invalid path!")
+
+
+class FileIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = TempDir()
+        self.root = self.directory.name
+        for sub in ('a', 'b', os.path.join('b', 'c')):
+            os.mkdir(os.path.join(self.root, sub))
+        for name in ('one.c', os.path.join('a', 'two.c'), os.path.join('b', 'c', 'three.h'),
+                     os.path.join('b', 'four.tar.gz'), os.path.join('b', '.c')):
+            self.write(name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write("/* {} */\n".format(name))
+
+    def touch_directory(self, directory, index):
+        """move the mtime of a directory forward, so the test doesn't depend on the file system's clock resolution"""
+        mtime = index.directories[directory][0] + 10**9
+        os.utime(directory, ns=(mtime, mtime))
+
+    def new_index(self, index_path=None):
+        index = FileIndex(self.root, index_path)
+        index.racy_window_ns = -10**12  # trust every mtime, the test moves them on by hand
+        return index
+
+    def test_matches_find_files(self):
+        index = self.new_index()
+        for suffix in ('.c', '.h', '.gz', '.tar.gz', 'o.c', '.cpp'):
+            self.assertEqual(index.find_files(suffix, sort=True), find_files(suffix, self.root, sort=True))
+
+    def test_unchanged_tree_is_not_listed_again(self):
+        index = self.new_index()
+        self.assertEqual(index.refresh(), 4)
+        self.assertEqual(index.refresh(), 0)
+
+    def test_only_changed_directories_are_listed(self):
+        index = self.new_index()
+        index.refresh()
+        self.write(os.path.join('a', 'five.c'))
+        self.touch_directory(os.path.join(self.root, 'a'), index)
+        self.assertEqual(index.refresh(), 1)
+        self.assertIn(os.path.join(self.root, 'a', 'five.c'), index.find_files('.c'))
+
+    def test_removed_directory(self):
+        index = self.new_index()
+        index.refresh()
+        os.remove(os.path.join(self.root, 'b', 'c', 'three.h'))
+        os.rmdir(os.path.join(self.root, 'b', 'c'))
+        self.touch_directory(os.path.join(self.root, 'b'), index)
+        self.assertEqual(index.refresh(), 1)
+        self.assertIsNone(index.find_files('.h'))
+        self.assertNotIn('.h', index.by_extension)
+
+    def test_recent_changes_are_listed_again(self):
+        index = FileIndex(self.root)
+        index.refresh()
+        self.assertEqual(index.refresh(), 4)
+
+    def test_relist_directory_with_files_sharing_an_extension(self):
+        # only 'a' has .txt files, so the first of them empties by_extension['.txt']
+        for name in ('x.txt', 'y.txt', 'z.txt'):
+            self.write(os.path.join('a', name))
+        expected = find_files('.txt', self.root, sort=True)
+        index = FileIndex(self.root)
+        for _ in range(2):
+            # the tree was just written, so the second call lists every directory again
+            self.assertEqual(index.find_files('.txt', sort=True), expected)
+        os.remove(os.path.join(self.root, 'a', 'x.txt'))
+        index = self.new_index()
+        index.refresh()
+        self.touch_directory(os.path.join(self.root, 'a'), index)
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(index.find_files('.txt', sort=True), expected[1:])
+
+    def test_save_and_load(self):
+        index_path = os.path.join(self.root, 'b', 'index.pickle')
+        index = self.new_index(index_path)
+        index.refresh()
+        index.save()
+        loaded = self.new_index(index_path)
+        self.assertEqual(loaded.find_files('.c', refresh=False, sort=True), index.find_files('.c', sort=True))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            FileIndex("!invalid path!")
+        with self.assertRaises(ValueError):
+            self.new_index().find_files('')
+        with self.assertRaises(ValueError):
+            self.new_index().save()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,24 +3,44 @@ Active Directory
 
 In Windows Active Directory, a group can consist of user(s) and group(s) themselves.
 """
+import csv
+import io
 import unittest
+from array import array
+from bisect import bisect_left
 
 
 class Group(object):
+    __slots__ = ('name', 'groups', 'users', 'indexes', 'descendants')
+
+    # bumped by every add_group, which makes every cached set of descendant groups stale
+    generation = 0
+
     def __init__(self, name):
         if name is None:
             raise ValueError("name cannot be None")
         if len(name) == 0:
             raise ValueError("name cannot be empty")
         self.name = name
-        self.groups = []
-        self.users = []
+        self.groups = set()
+        self.users = set()
+        self.indexes = []  # MembershipIndexes to keep up to date
+        self.descendants = (-1, None)  # (generation, set of descendant groups) for descendant_groups
 
     def add_group(self, group):
-        self.groups.append(group)
+        if group in self.groups:
+            return
+        self.groups.add(group)
+        Group.generation += 1
+        for index in self.indexes:
+            index.group_added(self, group)
 
     def add_user(self, user):
-        self.users.append(user)
+        if user in self.users:
+            return
+        self.users.add(user)
+        for index in self.indexes:
+            index.user_added(self, user)
 
     def get_groups(self):
         return self.groups
@@ -32,6 +52,54 @@ class Group(object):
         return self.name
 
 
+def walk_groups(group):
+    """Yield group and every group beneath it, each one once even if it is reachable in more
+    than one way (or contains itself)
+
+    Args:
+      group(class:Group): group to start from
+    """
+    visited = {group}
+    stack = [group]
+    while stack:
+        group = stack.pop()
+        yield group
+        for subgroup in group.get_groups():
+            if subgroup not in visited:
+                visited.add(subgroup)
+                stack.append(subgroup)
+
+
+def descendant_groups(group):
+    """
+    Return the set of group and every group beneath it.
+
+    The set is remembered until the next call to add_group on any group, and sets already
+    remembered for subgroups are reused rather than walked again.
+
+    Args:
+      group(class:Group): group to start from
+    """
+    generation, descendants = group.descendants
+    if generation == Group.generation:
+        return descendants
+    descendants = {group}
+    stack = [group]
+    while stack:
+        for subgroup in stack.pop().get_groups():
+            if subgroup in descendants:
+                continue
+            generation, cached = subgroup.descendants
+            if generation == Group.generation:
+                descendants |= cached
+            else:
+                descendants.add(subgroup)
+                stack.append(subgroup)
+    descendants = frozenset(descendants)
+    group.descendants = (Group.generation, descendants)
+    return descendants
+
+
 def is_user_in_group(user, group):
     """
     Return True if user is in the group, False otherwise.
@@ -40,14 +108,411 @@ def is_user_in_group(user, group):
       user(str): user name/id
       group(class:Group): group to check user membership against
     """
-    # first look to see if it's in the current group
-    for group_user in group.get_users():
-        if group_user == user:
-            return True
-    for subgroup in group.get_groups():
-        if is_user_in_group(user, subgroup):
-            return True
-    return False
+    if isinstance(group, CompactGroup):
+        return group.directory.is_user_in_group(user, group)
+    return any(user in subgroup.get_users() for subgroup in descendant_groups(group))
+
+
+def check_many(pairs):
+    """
+    Return whether each user is in each group, for many (user, group) pairs at once.
+
+    The pairs are grouped by group, so each group's descendants are only found once. When
+    checking a group's descendants one by one for every user would cost more than collecting
+    every user beneath it, the users are collected into a set so each check is a single lookup.
+    Pairs with a CompactGroup are passed on to the check_many of its CompactDirectory.
+
+    Args:
+      pairs(iterable): (user, Group or CompactGroup) pairs
+    Returns:
+      list of True/False, one for each pair
+    """
+    pairs = list(pairs)
+    users_by_group = {}
+    compact_positions = {}  # CompactDirectory -> positions of the pairs with its groups
+    for position, (user, group) in enumerate(pairs):
+        if isinstance(group, CompactGroup):
+            compact_positions.setdefault(group.directory, []).append(position)
+        else:
+            users_by_group.setdefault(group, []).append(user)
+    answers = {}
+    for group, users in users_by_group.items():
+        descendants = descendant_groups(group)
+        if len(descendants) == 1:
+            answers[group] = group.get_users().__contains__
+        elif len(users) * len(descendants) > sum(len(subgroup.get_users()) for subgroup in descendants):
+            users_beneath = set().union(*(subgroup.get_users() for subgroup in descendants))
+            answers[group] = users_beneath.__contains__
+        else:
+            answers[group] = lambda user, descendants=descendants: any(
+                user in subgroup.get_users() for subgroup in descendants)
+    results = [None if isinstance(group, CompactGroup) else answers[group](user) for user, group in pairs]
+    for directory, positions in compact_positions.items():
+        for position, answer in zip(positions, directory.check_many([pairs[position] for position in positions])):
+            results[position] = answer
+    return results
+
+
+def load_memberships(rows, groups=None):
+    """
+    Build groups from a membership export, one membership at a time.
+
+    Each row is (group name, 'user' or 'group', member name) - e.g. csv.reader over a CSV
+    export. A group is created the first time its name is seen, whether as a group or as a
+    member. Duplicate memberships are ignored.
+
+    Args:
+      rows(iterable): (group name, member type, member name) rows
+      groups(dict): group name -> Group to add to, if any
+    Returns:
+      dict of group name -> Group
+    """
+    if groups is None:
+        groups = {}
+    for group_name, member_type, member in rows:
+        group = groups.get(group_name)
+        if group is None:
+            group = groups[group_name] = Group(group_name)
+        if member_type == 'user':
+            group.add_user(member)
+        elif member_type == 'group':
+            subgroup = groups.get(member)
+            if subgroup is None:
+                subgroup = groups[member] = Group(member)
+            group.add_group(subgroup)
+        else:
+            raise ValueError('unknown member type: {}'.format(member_type))
+    return groups
+
+
+class MembershipIndex(object):
+    """Keeps track of every group each user is in, directly or through subgroups
+
+    The index is kept up to date as users and groups are added to the groups it covers, so
+    checking membership is a single set lookup.
+    """
+    def __init__(self, *groups):
+        """
+        Args:
+            groups (Group): groups to index, along with all of their subgroups
+        """
+        self.user_groups = {}  # user -> set of groups the user is in
+        self.parents = {}  # group -> set of groups that directly contain it
+        for group in groups:
+            self.watch(group)
+
+    def watch(self, group):
+        """Add group and all of its subgroups to the index
+
+        Args:
+            group (Group): group to index
+        """
+        if isinstance(group, CompactGroup):
+            raise TypeError('a MembershipIndex can only hold Group objects, not CompactGroup {}'.format(
+                group.get_name()))
+        new_groups = []
+        stack = [group]
+        while stack:
+            group = stack.pop()
+            if group not in self.parents:
+                self.parents[group] = set()
+                group.indexes.append(self)
+                new_groups.append(group)
+                stack.extend(group.get_groups())
+        old_subgroups = []
+        new_group_set = set(new_groups)
+        for group in new_groups:
+            for subgroup in group.get_groups():
+                if subgroup not in new_group_set:
+                    old_subgroups.append((group, subgroup))
+                self.parents[subgroup].add(group)
+        for group in new_groups:
+            if not group.get_users():
+                continue
+            ancestors = self.ancestors(group)
+            for user in group.get_users():
+                self.user_groups.setdefault(user, set()).update(ancestors)
+        for group, subgroup in old_subgroups:
+            self.add_users_to_ancestors(group, subgroup)
+
+    def ancestors(self, group):
+        """Returns the set of group and every group that contains it, directly or indirectly"""
+        ancestors = {group}
+        stack = [group]
+        while stack:
+            for parent in self.parents[stack.pop()]:
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    stack.append(parent)
+        return ancestors
+
+    def add_users_to_ancestors(self, group, subgroup):
+        """Put every user beneath subgroup in group and all of group's ancestors"""
+        ancestors = self.ancestors(group)
+        visited = {subgroup}
+        stack = [subgroup]
+        while stack:
+            current = stack.pop()
+            for user in current.get_users():
+                self.user_groups.setdefault(user, set()).update(ancestors)
+            for child in current.get_groups():
+                if child not in visited:
+                    visited.add(child)
+                    stack.append(child)
+
+    def user_added(self, group, user):
+        """Called by Group.add_user"""
+        self.user_groups.setdefault(user, set()).update(self.ancestors(group))
+
+    def group_added(self, group, subgroup):
+        """Called by Group.add_group"""
+        self.watch(subgroup)
+        self.parents[subgroup].add(group)
+        self.add_users_to_ancestors(group, subgroup)
+
+    def groups_of(self, user):
+        """Returns the set of groups user is in, directly or through subgroups"""
+        return self.user_groups.get(user, set())
+
+    def is_user_in_group(self, user, group):
+        """
+        Return True if user is in the group, False otherwise.
+
+        Args:
+          user(str): user name/id
+          group(class:Group): group to check user membership against
+        """
+        if group not in self.parents:
+            raise ValueError('group {} is not in the index'.format(group.get_name()))
+        return group in self.user_groups.get(user, ())
+
+
+def insert_sorted(values, value):
+    """Insert value into the sorted array values, unless it is already there
+
+    Returns:
+        True if value was inserted
+    """
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        return False
+    values.insert(i, value)
+    return True
+
+
+def contains_sorted(values, value):
+    """Returns True if the sorted array values contains value"""
+    i = bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+
+class CompactDirectory(object):
+    """A directory of groups that takes a fraction of the memory of Group objects
+
+    User and group names are interned to integer ids, so each name is stored once however many
+    groups it is in. The members of each group are sorted arrays of ids, four bytes per
+    membership. Groups are used through CompactGroup objects, which have the same API as Group.
+    """
+    def __init__(self):
+        self.user_ids = {}  # user -> id
+        self.user_names = []  # id -> user
+        self.group_ids = {}  # group name -> id
+        self.group_names = []  # id -> group name
+        self.users = []  # group id -> sorted array of user ids
+        self.groups = []  # group id -> sorted array of subgroup ids
+        self.descendants = {}  # group id -> set of descendant group ids, cleared by add_group
+
+    def group(self, name):
+        """Returns the group called name, creating it if it doesn't exist yet
+
+        Args:
+            name (str): name of the group
+        Returns:
+            CompactGroup
+        """
+        group_id = self.group_ids.get(name)
+        if group_id is None:
+            if name is None:
+                raise ValueError("name cannot be None")
+            if len(name) == 0:
+                raise ValueError("name cannot be empty")
+            group_id = self.group_ids[name] = len(self.group_names)
+            self.group_names.append(name)
+            self.users.append(array('I'))
+            self.groups.append(array('I'))
+        return CompactGroup(self, group_id)
+
+    def add_user(self, group_id, user):
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            user_id = self.user_ids[user] = len(self.user_names)
+            self.user_names.append(user)
+        insert_sorted(self.users[group_id], user_id)
+
+    def add_group(self, group_id, subgroup_id):
+        if insert_sorted(self.groups[group_id], subgroup_id):
+            self.descendants.clear()
+
+    def descendant_ids(self, group_id):
+        """Returns the set of group_id and the ids of every group beneath it"""
+        descendants = self.descendants.get(group_id)
+        if descendants is not None:
+            return descendants
+        descendants = {group_id}
+        stack = [group_id]
+        while stack:
+            for subgroup_id in self.groups[stack.pop()]:
+                if subgroup_id in descendants:
+                    continue
+                cached = self.descendants.get(subgroup_id)
+                if cached is not None:
+                    descendants |= cached
+                else:
+                    descendants.add(subgroup_id)
+                    stack.append(subgroup_id)
+        descendants = self.descendants[group_id] = frozenset(descendants)
+        return descendants
+
+    def is_user_in_group(self, user, group):
+        """
+        Return True if user is in the group, False otherwise.
+
+        Args:
+          user(str): user name/id
+          group(class:CompactGroup): group to check user membership against
+        """
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            return False
+        users = self.users
+        return any(contains_sorted(users[group_id], user_id) for group_id in self.descendant_ids(group.id))
+
+    def check_many(self, pairs):
+        """
+        Return whether each user is in each group, for many (user, group) pairs at once.
+
+        The pairs are grouped by group, and as in check_many, the ids of the users beneath a
+        group are collected into a set when that costs less than checking each descendant.
+
+        Args:
+          pairs(iterable): (user, CompactGroup) pairs
+        Returns:
+          list of True/False, one for each pair
+        """
+        pairs = list(pairs)
+        count = {}
+        for _, group in pairs:
+            count[group.id] = count.get(group.id, 0) + 1
+        users_beneath = {}
+        for group_id, num_checks in count.items():
+            descendants = self.descendant_ids(group_id)
+            if num_checks * len(descendants) > sum(len(self.users[descendant]) for descendant in descendants):
+                users_beneath[group_id] = set().union(*(self.users[descendant] for descendant in descendants))
+        answers = []
+        for user, group in pairs:
+            user_id = self.user_ids.get(user)
+            if user_id is None:
+                answers.append(False)
+            elif group.id in users_beneath:
+                answers.append(user_id in users_beneath[group.id])
+            else:
+                answers.append(self.is_user_in_group(user, group))
+        return answers
+
+    def load_memberships(self, rows):
+        """
+        Add the memberships of an export to the directory - see load_memberships.
+
+        The ids are appended as they are read, and each array that grew is sorted and has its
+        duplicates removed once at the end, instead of inserting every membership in order.
+
+        Args:
+          rows(iterable): (group name, member type, member name) rows
+        """
+        group_ids = self.group_ids
+        user_ids = self.user_ids
+        user_names = self.user_names
+        grown_users = set()  # ids of the groups whose users need sorting
+        grown_groups = set()  # ids of the groups whose subgroups need sorting
+        try:
+            for group_name, member_type, member in rows:
+                group_id = group_ids.get(group_name)
+                if group_id is None:
+                    group_id = self.group(group_name).id
+                if member_type == 'user':
+                    user_id = user_ids.get(member)
+                    if user_id is None:
+                        user_id = user_ids[member] = len(user_names)
+                        user_names.append(member)
+                    self.users[group_id].append(user_id)
+                    grown_users.add(group_id)
+                elif member_type == 'group':
+                    subgroup_id = group_ids.get(member)
+                    if subgroup_id is None:
+                        subgroup_id = self.group(member).id
+                    self.groups[group_id].append(subgroup_id)
+                    grown_groups.add(group_id)
+                else:
+                    raise ValueError('unknown member type: {}'.format(member_type))
+        finally:
+            # the rows read before an error stay loaded, so the arrays have to be sorted either way
+            for members, grown in ((self.users, grown_users), (self.groups, grown_groups)):
+                for group_id in grown:
+                    members[group_id] = array('I', sorted(set(members[group_id])))
+            if grown_groups:
+                self.descendants.clear()
+
+    @classmethod
+    def from_groups(cls, *groups):
+        """Copy groups and every group beneath them into a new CompactDirectory
+
+        Args:
+            groups (Group): groups to copy
+        Returns:
+            CompactDirectory
+        """
+        directory = cls()
+        for group in groups:
+            for descendant in walk_groups(group):
+                compact_group = directory.group(descendant.get_name())
+                for user in descendant.get_users():
+                    compact_group.add_user(user)
+                for subgroup in descendant.get_groups():
+                    compact_group.add_group(directory.group(subgroup.get_name()))
+        return directory
+
+
+class CompactGroup(object):
+    """A group in a CompactDirectory, with the same API as Group"""
+    __slots__ = ('directory', 'id')
+
+    def __init__(self, directory, group_id):
+        self.directory = directory
+        self.id = group_id
+
+    def __eq__(self, other):
+        return isinstance(other, CompactGroup) and self.directory is other.directory and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def add_group(self, group):
+        if group.directory is not self.directory:
+            raise ValueError('group {} is in another directory'.format(group.get_name()))
+        self.directory.add_group(self.id, group.id)
+
+    def add_user(self, user):
+        self.directory.add_user(self.id, user)
+
+    def get_groups(self):
+        return {CompactGroup(self.directory, group_id) for group_id in self.directory.groups[self.id]}
+
+    def get_users(self):
+        user_names = self.directory.user_names
+        return {user_names[user_id] for user_id in self.directory.users[self.id]}
+
+    def get_name(self):
+        return self.directory.group_names[self.id]
 
 
 class ActiveDirectoryTestCase(unittest.TestCase):
@@ -74,5 +539,221 @@ class ActiveDirectoryTestCase(unittest.TestCase):
             Group('')
 
 
+class GroupTraversalTestCase(unittest.TestCase):
+    def test_cycle(self):
+        first = Group("first")
+        second = Group("second")
+        first.add_group(second)
+        second.add_group(first)
+        second.add_user("donald duck")
+        self.assertTrue(is_user_in_group("donald duck", first))
+        self.assertFalse(is_user_in_group("daffy duck", first))
+        self.assertEqual(descendant_groups(first), {first, second})
+        self.assertEqual(list(walk_groups(second)), [second, first])
+
+    def test_deep_chain(self):
+        # deeper than the recursion limit
+        groups = [Group("group{}".format(i)) for i in range(5000)]
+        for parent, child in zip(groups, groups[1:]):
+            parent.add_group(child)
+        groups[-1].add_user("donald duck")
+        self.assertTrue(is_user_in_group("donald duck", groups[0]))
+        self.assertEqual(len(descendant_groups(groups[0])), 5000)
+
+    def test_diamond(self):
+        # every group in a layer contains both groups in the next layer
+        layers = [[Group("a{}".format(i)), Group("b{}".format(i))] for i in range(100)]
+        for layer, next_layer in zip(layers, layers[1:]):
+            for group in layer:
+                for subgroup in next_layer:
+                    group.add_group(subgroup)
+        layers[-1][1].add_user("donald duck")
+        self.assertTrue(is_user_in_group("donald duck", layers[0][0]))
+        self.assertEqual(len(list(walk_groups(layers[0][0]))), 199)
+
+    def test_cache_invalidated_by_add_group(self):
+        parent = Group("parent")
+        child = Group("child")
+        grandchild = Group("grandchild")
+        grandchild.add_user("donald duck")
+        parent.add_group(child)
+        self.assertFalse(is_user_in_group("donald duck", parent))
+        self.assertEqual(descendant_groups(parent), {parent, child})
+        child.add_group(grandchild)
+        self.assertTrue(is_user_in_group("donald duck", parent))
+        self.assertEqual(descendant_groups(parent), {parent, child, grandchild})
+        # users added later are found without invalidating anything
+        grandchild.add_user("daffy duck")
+        self.assertTrue(is_user_in_group("daffy duck", parent))
+
+
+class BulkTestCase(unittest.TestCase):
+    EXPORT = """parent,group,child1
+parent,group,child2
+child1,group,subchild
+subchild,user,donald duck
+subchild,user,donald duck
+child2,user,daffy duck
+parent,group,child1
+"""
+
+    def test_load_memberships(self):
+        groups = load_memberships(csv.reader(io.StringIO(self.EXPORT)))
+        self.assertEqual(set(groups), {"parent", "child1", "child2", "subchild"})
+        self.assertEqual(groups["subchild"].get_users(), {"donald duck"})
+        self.assertEqual(groups["parent"].get_groups(), {groups["child1"], groups["child2"]})
+        self.assertTrue(is_user_in_group("donald duck", groups["parent"]))
+        self.assertFalse(is_user_in_group("daffy duck", groups["child1"]))
+        # loading more into existing groups keeps their indexes up to date
+        index = MembershipIndex(groups["parent"])
+        load_memberships([("child1", "user", "daffy duck")], groups)
+        self.assertTrue(index.is_user_in_group("daffy duck", groups["child1"]))
+        with self.assertRaises(ValueError):
+            load_memberships([("parent", "computer", "pc1")])
+
+    def test_check_many(self):
+        groups = load_memberships(csv.reader(io.StringIO(self.EXPORT)))
+        users = ["donald duck", "daffy duck", "scrooge mcduck"]
+        pairs = [(user, group) for user in users for group in groups.values()] * 3
+        self.assertEqual(check_many(pairs), [is_user_in_group(user, group) for user, group in pairs])
+        self.assertEqual(check_many([]), [])
+
+    def test_check_many_compact_groups(self):
+        groups = load_memberships(csv.reader(io.StringIO(self.EXPORT)))
+        directory = CompactDirectory.from_groups(groups["parent"])
+        other = CompactDirectory.from_groups(groups["child2"])
+        users = ["donald duck", "daffy duck", "scrooge mcduck"]
+        expected = [is_user_in_group(user, group) for user in users for group in groups.values()]
+        compact = [(user, directory.group(name)) for user in users for name in groups]
+        self.assertEqual(check_many(compact), expected)
+        # mixed with Group objects and the groups of another directory
+        mixed = [(user, group) for user in users for group in groups.values()]
+        mixed += compact + [(user, other.group("child2")) for user in users]
+        self.assertEqual(check_many(mixed), expected * 2 + [is_user_in_group(user, groups["child2"]) for user in users])
+
+
+class CompactDirectoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = CompactDirectory()
+        self.parent = self.directory.group("parent")
+        self.child1 = self.directory.group("child1")
+        self.child2 = self.directory.group("child2")
+        self.sub_child = self.directory.group("subchild")
+        self.sub_child.add_user("donald duck")
+        self.child1.add_group(self.sub_child)
+        self.parent.add_group(self.child1)
+        self.parent.add_group(self.child2)
+
+    def test_group_api(self):
+        self.assertEqual(self.directory.group("parent"), self.parent)
+        self.assertEqual(self.parent.get_name(), "parent")
+        self.assertEqual(self.parent.get_groups(), {self.child1, self.child2})
+        self.sub_child.add_user("donald duck")
+        self.assertEqual(self.sub_child.get_users(), {"donald duck"})
+        self.assertEqual(list(self.directory.users[self.sub_child.id]), [0])
+        with self.assertRaises(ValueError):
+            self.directory.group("")
+        with self.assertRaises(ValueError):
+            self.parent.add_group(CompactDirectory().group("other"))
+
+    def test_is_user_in_group(self):
+        self.assertTrue(is_user_in_group("donald duck", self.parent))
+        self.assertFalse(is_user_in_group("daffy duck", self.parent))
+        self.assertFalse(is_user_in_group("donald duck", self.child2))
+        self.child2.add_user("daffy duck")
+        self.sub_child.add_group(self.parent)
+        self.assertTrue(is_user_in_group("daffy duck", self.sub_child))
+        self.assertTrue(is_user_in_group("daffy duck", self.parent))
+
+    def test_check_many(self):
+        groups = [self.parent, self.child1, self.child2, self.sub_child]
+        pairs = [(user, group) for user in ("donald duck", "daffy duck") for group in groups] * 3
+        self.assertEqual(self.directory.check_many(pairs), [is_user_in_group(user, group) for user, group in pairs])
+
+    def test_same_answers_as_groups(self):
+        groups = load_memberships(csv.reader(io.StringIO(BulkTestCase.EXPORT)))
+        directory = CompactDirectory.from_groups(groups["parent"])
+        loaded = CompactDirectory()
+        loaded.load_memberships(csv.reader(io.StringIO(BulkTestCase.EXPORT)))
+        for name, group in groups.items():
+            for user in ("donald duck", "daffy duck", "scrooge mcduck"):
+                self.assertEqual(is_user_in_group(user, directory.group(name)), is_user_in_group(user, group))
+                self.assertEqual(is_user_in_group(user, loaded.group(name)), is_user_in_group(user, group))
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Group("parent").email = "parent@example.com"
+
+
+class MembershipIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.parent = Group("parent")
+        self.child1 = Group("child1")
+        self.child2 = Group("child2")
+        self.sub_child = Group("subchild")
+        self.sub_child.add_user("donald duck")
+        self.child1.add_group(self.sub_child)
+        self.parent.add_group(self.child1)
+        self.parent.add_group(self.child2)
+
+    def test_existing_groups(self):
+        index = MembershipIndex(self.parent)
+        self.assertTrue(index.is_user_in_group("donald duck", self.parent))
+        self.assertTrue(index.is_user_in_group("donald duck", self.sub_child))
+        self.assertFalse(index.is_user_in_group("daffy duck", self.parent))
+        self.assertFalse(index.is_user_in_group("donald duck", self.child2))
+        self.assertEqual(index.groups_of("donald duck"), {self.parent, self.child1, self.sub_child})
+
+    def test_incremental_updates(self):
+        index = MembershipIndex(self.parent)
+        self.child2.add_user("daffy duck")
+        self.assertTrue(index.is_user_in_group("daffy duck", self.parent))
+        self.assertFalse(index.is_user_in_group("daffy duck", self.child1))
+        # adding a group that already has users and subgroups
+        new_group = Group("new")
+        new_sub_group = Group("newsub")
+        new_sub_group.add_user("scrooge mcduck")
+        new_group.add_group(new_sub_group)
+        self.child2.add_group(new_group)
+        self.assertTrue(index.is_user_in_group("scrooge mcduck", self.parent))
+        self.assertTrue(index.is_user_in_group("scrooge mcduck", new_group))
+        # adding to a group that was indexed through another one
+        new_sub_group.add_user("huey")
+        self.assertTrue(index.is_user_in_group("huey", self.parent))
+        # a group that is already indexed
+        self.child2.add_group(self.sub_child)
+        self.assertTrue(index.is_user_in_group("donald duck", self.child2))
+
+    def test_matches_is_user_in_group(self):
+        index = MembershipIndex(self.parent)
+        groups = [self.parent, self.child1, self.child2, self.sub_child]
+        self.sub_child.add_group(self.child2)
+        self.child2.add_user("daffy duck")
+        for group in groups:
+            for user in ("donald duck", "daffy duck", "scrooge mcduck"):
+                self.assertEqual(index.is_user_in_group(user, group), is_user_in_group(user, group))
+
+    def test_cycle(self):
+        index = MembershipIndex(self.parent)
+        self.sub_child.add_group(self.parent)
+        self.child2.add_user("daffy duck")
+        self.assertTrue(index.is_user_in_group("daffy duck", self.sub_child))
+        self.assertTrue(index.is_user_in_group("daffy duck", self.child1))
+        self.assertTrue(index.is_user_in_group("donald duck", self.parent))
+        self.assertFalse(index.is_user_in_group("donald duck", self.child2))
+
+    def test_group_not_in_index(self):
+        index = MembershipIndex(self.child1)
+        with self.assertRaises(ValueError):
+            index.is_user_in_group("donald duck", self.parent)
+
+    def test_compact_group(self):
+        group = CompactDirectory.from_groups(self.parent).group("parent")
+        with self.assertRaises(TypeError):
+            MembershipIndex(group)
+        with self.assertRaises(TypeError):
+            MembershipIndex(self.parent).watch(group)
+
+
 if __name__ == '__main__':
     unittest.main()
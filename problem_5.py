@@ -7,8 +7,21 @@ previous block, a timestamp, and transaction data. For our blockchain we will be
 Greenwich Mean Time when the block was created, and text strings as the data.
 """
 import unittest
+import calendar
 import hashlib
+import hmac
+import itertools
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
 import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from tempfile import TemporaryDirectory as TempDir
 
 
 class DoubleNode:
@@ -41,8 +54,104 @@ class DoublyLinkedList:
         return out
 
 
+# prefixes that keep the hash of a transaction from ever being mistaken for the hash of two others
+MERKLE_LEAF = b'\x00'
+MERKLE_NODE = b'\x01'
+
+
+def merkle_levels(transactions):
+    """Builds a Merkle tree over a batch of transactions
+
+    Each transaction is hashed, then each pair of hashes is hashed together, level by level, up
+    to a single root hash. An odd hash at the end of a level moves up a level as it is.
+
+    Args:
+        transactions (list): the transactions (str)
+    Returns:
+        list of levels, from the transaction hashes up to [root], each a list of digests (bytes)
+    """
+    if not transactions:
+        raise ValueError("transactions cannot be empty")
+    sha256 = hashlib.sha256
+    level = [sha256(MERKLE_LEAF + transaction.encode('utf-8')).digest() for transaction in transactions]
+    levels = [level]
+    while len(level) > 1:
+        next_level = [sha256(MERKLE_NODE + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        levels.append(next_level)
+        level = next_level
+    return levels
+
+
+def merkle_proof(levels, index):
+    """Returns the proof that transaction number index is in a Merkle tree
+
+    Args:
+        levels (list): the tree, from merkle_levels
+        index (int): position of the transaction in the batch
+    Returns:
+        list of (sibling hash (hex), True if the sibling is on the left) from the bottom up
+    """
+    if not 0 <= index < len(levels[0]):
+        raise IndexError('there is no transaction {}'.format(index))
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), sibling < index))
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(transaction, proof, merkle_root):
+    """Returns True if proof shows transaction is in the tree with this root
+
+    Args:
+        transaction (str): the transaction
+        proof (list): the proof, from merkle_proof
+        merkle_root (str): root hash of the tree (hex)
+    """
+    sha256 = hashlib.sha256
+    digest = sha256(MERKLE_LEAF + transaction.encode('utf-8')).digest()
+    for sibling, sibling_on_left in proof:
+        if sibling_on_left:
+            digest = sha256(MERKLE_NODE + bytes.fromhex(sibling) + digest).digest()
+        else:
+            digest = sha256(MERKLE_NODE + digest + bytes.fromhex(sibling)).digest()
+    return digest.hex() == merkle_root
+
+
+def block_hash_prefix(timestamp, data, previous_hash):
+    """The bytes hashed for a block, before the nonce"""
+    time_str = time.strftime('%Y-%m-%dT%H:%M:%SZ', timestamp)
+    return '{}{}{}'.format(time_str, data, previous_hash).encode('utf-8')
+
+
+def calc_block_hash(timestamp, data, previous_hash, nonce=None):
+    """SHA-256 hash of a block's timestamp, data, previous hash and nonce (if any), as a hex string"""
+    sha = hashlib.sha256(block_hash_prefix(timestamp, data, previous_hash))
+    if nonce is not None:
+        sha.update(str(nonce).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def meets_difficulty(block_hash, difficulty):
+    """Returns True if the hash (hex) starts with at least difficulty zero bits"""
+    return int(block_hash, 16) >> (256 - difficulty) == 0
+
+
 class Block:
-    def __init__(self, timestamp, data, previous_hash):
+    def __init__(self, timestamp, data, previous_hash, block_hash=None, nonce=None):
+        """
+        Args:
+            timestamp (time.struct_time): when the block was created (GMT)
+            data (str): the block's data
+            previous_hash (str): hash of the previous block, or None for the first block
+            block_hash (str): the block's hash if it is already known (e.g. it was stored) - it is
+                only checked by verify_chain
+            nonce (int): number that was mined to make the hash meet a difficulty, or None
+        """
         if timestamp is None:
             raise ValueError("timestamp cannot be None")
         if data is None:
@@ -50,14 +159,599 @@ class Block:
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
-        self.hash = self.calc_hash()
+        self.nonce = nonce
+        self.hash = self.calc_hash() if block_hash is None else block_hash
+        self.transactions = None  # set by from_transactions, along with the Merkle tree
+        self.merkle_levels = None
+
+    @staticmethod
+    def from_transactions(timestamp, transactions, previous_hash):
+        """Creates a block for a batch of transactions
+
+        The block's data is the Merkle root of the transactions, so it is what goes into the
+        block's hash, and any one transaction can be shown to be in the block with prove().
+
+        Args:
+            timestamp (time.struct_time): when the block was created (GMT)
+            transactions (list): the transactions (str)
+            previous_hash (str): hash of the previous block, or None for the first block
+        Returns:
+            Block
+        """
+        levels = merkle_levels(transactions)
+        block = Block(timestamp, levels[-1][0].hex(), previous_hash)
+        block.transactions = transactions
+        block.merkle_levels = levels
+        return block
+
+    def prove(self, index):
+        """Returns the proof that transaction number index is in this block - see verify_merkle_proof"""
+        if self.merkle_levels is None:
+            raise ValueError("block was not created from transactions")
+        return merkle_proof(self.merkle_levels, index)
 
     def calc_hash(self):
-        sha = hashlib.sha256()
-        time_str = time.strftime('', self.timestamp)
-        hash_str = '{}{}{}'.format(time_str, self.data, self.previous_hash).encode('utf-8')
-        sha.update(hash_str)
-        return sha.hexdigest()
+        return calc_block_hash(self.timestamp, self.data, self.previous_hash, self.nonce)
+
+
+# record in a segment file: length of the data, timestamp (seconds since the epoch), whether there
+# is a previous hash, previous hash, hash, whether there is a nonce, nonce - followed by the data (utf-8)
+RECORD_HEADER = struct.Struct('<Iq?32s32s?Q')
+# index file header: number of slots, number of blocks, segment and offset of the last block,
+# segment and offset of the end of the last block indexed
+INDEX_HEADER = struct.Struct('<QQIQIQ')
+# index slot: first 8 bytes of the hash, segment number + 1 (0 for an empty slot), offset
+INDEX_SLOT = struct.Struct('<QIQ')
+NO_BLOCK = 0xFFFFFFFF  # segment number in the header before the first block is added
+
+# largest segment file - a new segment is started when a block doesn't fit
+SEGMENT_SIZE = 64 * 2**20
+# number of appends between calls to fsync
+SYNC_EVERY = 1000
+# number of slots in a new index - the index doubles whenever it is half full
+INDEX_CAPACITY = 1024
+
+
+class BlockStore:
+    """An append-only store of the blocks of a chain, kept on disk
+
+    The blocks are written one after another into segment files of at most segment_size bytes.
+    An index file holds an open addressing hash table from each block's hash to the segment and
+    offset it was written at. Both are memory-mapped for reading, so opening a store only reads
+    the index header, and looking up a block by hash is O(1).
+
+    Data is fsync'ed every sync_every appends and on close(). A record is handed to the OS before
+    the index points at it, so if the process dies in between, the index never refers to data that
+    isn't in the segment files, and blocks that made it into the segment files but not the index
+    are indexed again on open. If the machine goes down, the index can reach the disk ahead of the
+    end of the segment - the blocks that were lost are dropped from the index on open.
+    """
+    def __init__(self, path, segment_size=SEGMENT_SIZE, sync_every=SYNC_EVERY):
+        """
+        Args:
+            path (str): directory to keep the store in - created if it doesn't exist
+            segment_size (int): largest segment file in bytes
+            sync_every (int): number of appends between calls to fsync
+        """
+        if segment_size < RECORD_HEADER.size:
+            raise ValueError('segment_size is too small')
+        if sync_every < 1:
+            raise ValueError('sync_every must be at least 1')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self.maps = {}  # segment number -> mmap of the segment file
+        self.unsynced = 0
+        index_path = os.path.join(path, 'index')
+        if not os.path.exists(index_path):
+            self.create_index(index_path, INDEX_CAPACITY)
+        self.open_index(index_path)
+        self.writer = open(self.segment_path(self.end_segment), 'ab')
+        self.recover()
+
+    def segment_path(self, segment):
+        return os.path.join(self.path, 'segment-{:08d}'.format(segment))
+
+    @staticmethod
+    def create_index(index_path, capacity, header=(0, NO_BLOCK, 0, 0, 0)):
+        with open(index_path + '.new', 'wb') as f:
+            f.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+            f.write(INDEX_HEADER.pack(capacity, *header))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_path + '.new', index_path)
+
+    def open_index(self, index_path):
+        with open(index_path, 'r+b') as f:
+            self.index = mmap.mmap(f.fileno(), 0)
+        (self.capacity, self.count, self.tail_segment, self.tail_offset,
+         self.end_segment, self.end_offset) = INDEX_HEADER.unpack_from(self.index)
+
+    def write_index_header(self):
+        INDEX_HEADER.pack_into(self.index, 0, self.capacity, self.count, self.tail_segment, self.tail_offset,
+                               self.end_segment, self.end_offset)
+
+    def find_slot(self, raw_hash):
+        """Returns (slot number, segment, offset) of the block with this hash, or of the empty slot
+        it would go in (with segment None)"""
+        prefix = int.from_bytes(raw_hash[:8], 'little')
+        mask = self.capacity - 1
+        slot = prefix & mask
+        while True:
+            slot_prefix, segment, offset = INDEX_SLOT.unpack_from(self.index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if segment == 0:
+                return slot, None, None
+            # the first 8 bytes can be the same for different hashes, so check the record
+            if slot_prefix == prefix and self.read_header(segment - 1, offset)[4] == raw_hash:
+                return slot, segment - 1, offset
+            slot = (slot + 1) & mask
+
+    def add_to_index(self, raw_hash, segment, offset):
+        if (self.count + 1) * 2 > self.capacity:
+            self.grow_index()
+        slot, indexed_segment, _ = self.find_slot(raw_hash)
+        INDEX_SLOT.pack_into(self.index, INDEX_HEADER.size + slot * INDEX_SLOT.size,
+                             int.from_bytes(raw_hash[:8], 'little'), segment + 1, offset)
+        # recover() can find a block whose slot was written just before the header
+        if indexed_segment is None:
+            self.count += 1
+
+    def grow_index(self):
+        """Copy the index into one with twice as many slots"""
+        self.copy_index(self.capacity * 2)
+
+    def copy_index(self, capacity, keep=None):
+        """Copy the index into one with capacity slots
+
+        Args:
+            capacity (int): number of slots in the new index
+            keep (callable): keep(segment, offset) is False for the blocks to leave out, or None to keep every block
+        """
+        index_path = os.path.join(self.path, 'index')
+        old_index = self.index
+        old_capacity = self.capacity
+        # recover() calls this before the header has caught up, so keep the positions in memory
+        position = self.tail_segment, self.tail_offset, self.end_segment, self.end_offset
+        self.create_index(index_path + '.grow', capacity)
+        self.open_index(index_path + '.grow')
+        self.count = 0
+        mask = self.capacity - 1
+        for slot in range(old_capacity):
+            prefix, segment, offset = INDEX_SLOT.unpack_from(old_index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if segment == 0 or (keep is not None and not keep(segment - 1, offset)):
+                continue
+            # the full hashes are all different, so only an empty slot needs to be found
+            new_slot = prefix & mask
+            while INDEX_SLOT.unpack_from(self.index, INDEX_HEADER.size + new_slot * INDEX_SLOT.size)[1]:
+                new_slot = (new_slot + 1) & mask
+            INDEX_SLOT.pack_into(self.index, INDEX_HEADER.size + new_slot * INDEX_SLOT.size, prefix, segment, offset)
+            self.count += 1
+        self.tail_segment, self.tail_offset, self.end_segment, self.end_offset = position
+        self.write_index_header()
+        self.index.flush()
+        old_index.close()
+        os.replace(index_path + '.grow', index_path)
+
+    def segment_map(self, segment, end):
+        """Returns an mmap of the segment that covers at least end bytes"""
+        segment_map = self.maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            if segment == self.end_segment:
+                self.writer.flush()
+            if segment_map is not None:
+                segment_map.close()
+            with open(self.segment_path(segment), 'rb') as f:
+                segment_map = self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return segment_map
+
+    def read_header(self, segment, offset):
+        """Returns (length of the data, timestamp, has previous hash, previous hash, hash) of a record"""
+        return RECORD_HEADER.unpack_from(self.segment_map(segment, offset + RECORD_HEADER.size), offset)
+
+    def read_block(self, segment, offset, verify=True):
+        """Returns (block, length of its record)
+
+        Args:
+            segment (int): segment number
+            offset (int): offset of the record in the segment
+            verify (bool): recompute the block's hash and check it matches the stored one
+        """
+        data_length, timestamp, has_previous, previous_hash, raw_hash, has_nonce, nonce = self.read_header(
+            segment, offset)
+        start = offset + RECORD_HEADER.size
+        data = self.segment_map(segment, start + data_length)[start:start + data_length].decode('utf-8')
+        block = Block(time.gmtime(timestamp), data, previous_hash.hex() if has_previous else None,
+                      None if verify else raw_hash.hex(), nonce if has_nonce else None)
+        if verify and block.hash != raw_hash.hex():
+            raise ValueError('block at segment {} offset {} is corrupt'.format(segment, offset))
+        return block, RECORD_HEADER.size + data_length
+
+    def scan_segment(self, segment, size):
+        """Returns (offset of the last whole record in the first size bytes of the segment or None,
+        end of that record)"""
+        last, end = None, 0
+        while end + RECORD_HEADER.size <= size:
+            record_end = end + RECORD_HEADER.size + self.read_header(segment, end)[0]
+            if record_end > size:
+                break
+            last, end = end, record_end
+        return last, end
+
+    def drop_lost_blocks(self, size):
+        """Remove the blocks past the first size bytes of the last segment from the index"""
+        tail_offset, self.end_offset = self.scan_segment(self.end_segment, size)
+        tail_segment = self.end_segment
+        while tail_offset is None and tail_segment > 0:
+            tail_segment -= 1
+            tail_offset, _ = self.scan_segment(tail_segment, os.path.getsize(self.segment_path(tail_segment)))
+        if tail_offset is None:
+            self.tail_segment, self.tail_offset = NO_BLOCK, 0
+        else:
+            self.tail_segment, self.tail_offset = tail_segment, tail_offset
+        end_segment, end_offset = self.end_segment, self.end_offset
+        self.copy_index(self.capacity, lambda segment, offset: segment < end_segment or offset < end_offset)
+
+    def recover(self):
+        """Index any blocks that were written after the index was last updated, and drop any that
+        the index has but the segment files lost"""
+        while True:
+            path = self.segment_path(self.end_segment)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if self.end_offset > size:
+                self.drop_lost_blocks(size)
+            while self.end_offset + RECORD_HEADER.size <= size:
+                data_length, _, _, _, raw_hash, _, _ = self.read_header(self.end_segment, self.end_offset)
+                if self.end_offset + RECORD_HEADER.size + data_length > size:
+                    break
+                self.add_to_index(raw_hash, self.end_segment, self.end_offset)
+                self.tail_segment, self.tail_offset = self.end_segment, self.end_offset
+                self.end_offset += RECORD_HEADER.size + data_length
+            if self.end_offset < size:
+                # a record that was only partly written - drop it
+                self.writer.truncate(self.end_offset)
+            if not os.path.exists(self.segment_path(self.end_segment + 1)):
+                break
+            self.end_segment += 1
+            self.end_offset = 0
+            self.writer.close()
+            self.writer = open(self.segment_path(self.end_segment), 'ab')
+        self.write_index_header()
+        self.tail_hash = None
+        if self.count:
+            self.tail_hash = self.read_header(self.tail_segment, self.tail_offset)[4].hex()
+
+    def append(self, block):
+        """Add a block to the end of the chain
+
+        Args:
+            block (Block): the block - its previous_hash has to be the hash of the last block
+        """
+        if block.previous_hash != self.tail_hash:
+            raise ValueError('block does not follow the last block in the chain')
+        raw_hash = bytes.fromhex(block.hash)
+        data = block.data.encode('utf-8')
+        record = RECORD_HEADER.pack(len(data), calendar.timegm(block.timestamp), block.previous_hash is not None,
+                                    bytes.fromhex(block.previous_hash or ''), raw_hash, block.nonce is not None,
+                                    block.nonce or 0) + data
+        if self.end_offset > 0 and self.end_offset + len(record) > self.segment_size:
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+            self.writer.close()
+            self.end_segment += 1
+            self.end_offset = 0
+            self.writer = open(self.segment_path(self.end_segment), 'ab')
+        self.writer.write(record)
+        # the index mmap is shared with the OS straight away, so the record has to get there first
+        self.writer.flush()
+        self.add_to_index(raw_hash, self.end_segment, self.end_offset)
+        self.tail_segment, self.tail_offset = self.end_segment, self.end_offset
+        self.tail_hash = block.hash
+        self.end_offset += len(record)
+        self.write_index_header()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """Write everything to disk"""
+        self.writer.flush()
+        os.fsync(self.writer.fileno())
+        self.index.flush()
+        self.unsynced = 0
+
+    def get(self, block_hash):
+        """Returns the block with this hash, or None if it isn't in the chain"""
+        try:
+            raw_hash = bytes.fromhex(block_hash)
+        except (TypeError, ValueError):
+            return None
+        if len(raw_hash) != 32:
+            return None
+        _, segment, offset = self.find_slot(raw_hash)
+        return None if segment is None else self.read_block(segment, offset)[0]
+
+    def __contains__(self, block_hash):
+        return self.get(block_hash) is not None
+
+    def tail(self):
+        """Returns the last block in the chain, or None if it is empty"""
+        if self.count == 0:
+            return None
+        return self.read_block(self.tail_segment, self.tail_offset)[0]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yield every block, from the first to the last"""
+        return self.iter_blocks()
+
+    def iter_blocks(self, after=None, verify=True):
+        """Yield the blocks in order
+
+        Args:
+            after (str): hash of a block to start after, or None to start from the first block
+            verify (bool): check each block's stored hash (verify_chain does this itself)
+        Yields:
+            Block
+        """
+        segment, offset = 0, 0
+        if after is not None:
+            _, segment, offset = self.find_slot(bytes.fromhex(after))
+            if segment is None:
+                raise ValueError('block {} is not in the store'.format(after))
+            offset += RECORD_HEADER.size + self.read_header(segment, offset)[0]
+        for segment in range(segment, self.end_segment + 1):
+            end = self.end_offset if segment == self.end_segment else os.path.getsize(self.segment_path(segment))
+            while offset < end:
+                block, length = self.read_block(segment, offset, verify)
+                yield block
+                offset += length
+            offset = 0
+
+    def close(self):
+        self.sync()
+        self.writer.close()
+        for segment_map in self.maps.values():
+            segment_map.close()
+        self.maps.clear()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Checkpoint:
+    """The number of blocks at the start of a chain that have been verified, and the hash of the
+    last of them, signed with a secret key so it can't be forged"""
+    def __init__(self, num_blocks, block_hash, signature):
+        self.num_blocks = num_blocks
+        self.block_hash = block_hash
+        self.signature = signature
+
+    @staticmethod
+    def sign(num_blocks, block_hash, key):
+        """Returns a Checkpoint signed with key (bytes)"""
+        message = '{}:{}'.format(num_blocks, block_hash).encode('utf-8')
+        return Checkpoint(num_blocks, block_hash, hmac.new(key, message, hashlib.sha256).hexdigest())
+
+    def is_valid(self, key):
+        """Returns True if the checkpoint was signed with key"""
+        return hmac.compare_digest(Checkpoint.sign(self.num_blocks, self.block_hash, key).signature, self.signature)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'num_blocks': self.num_blocks, 'block_hash': self.block_hash, 'signature': self.signature}, f)
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        return Checkpoint(checkpoint['num_blocks'], checkpoint['block_hash'], checkpoint['signature'])
+
+
+# number of blocks hashed by each task in verify_chain
+VERIFY_BATCH_SIZE = 1000
+
+
+def hash_batch(batch):
+    """Returns the hash of each (timestamp, data, previous hash, nonce) in batch"""
+    return [calc_block_hash(timestamp, data, previous_hash, nonce) for timestamp, data, previous_hash, nonce in batch]
+
+
+def map_batches(function, batches, workers):
+    """Apply function to each batch on a pool of processes, yielding the results in order
+
+    Args:
+        function (callable): module level function to apply to each batch
+        batches (iterable): the batches
+        workers (int): number of processes - 1 applies function in this process
+    Yields:
+        function(batch) for each batch, in order
+    """
+    if workers == 1:
+        yield from map(function, batches)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(function, batch))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def verify_chain(blocks, key, checkpoint=None, workers=1, batch_size=VERIFY_BATCH_SIZE, difficulty=0):
+    """Check every block's hash and that it follows the block before it
+
+    The hashes are recomputed in batches on a pool of processes. Given a checkpoint from an
+    earlier call, only the blocks added since then are checked.
+
+    Args:
+        blocks (BlockStore or iterable): the chain, from its first block
+        key (bytes): secret key to sign checkpoints with
+        checkpoint (Checkpoint): checkpoint from an earlier call, or None to check every block
+        workers (int): number of processes
+        batch_size (int): number of blocks hashed by each task
+        difficulty (int): number of zero bits every block's hash has to start with
+    Returns:
+        Checkpoint covering every block in the chain
+    Raises:
+        ValueError naming a block that is wrong
+    """
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    num_blocks, previous_hash = 0, None
+    if checkpoint is not None:
+        if not checkpoint.is_valid(key):
+            raise ValueError('checkpoint signature is invalid')
+        if checkpoint.num_blocks == 0 and checkpoint.block_hash is not None:
+            raise ValueError('chain does not match the checkpoint')
+        num_blocks, previous_hash = checkpoint.num_blocks, checkpoint.block_hash
+    if isinstance(blocks, BlockStore):
+        # the store can start straight after the checkpoint, and hashes are checked below
+        blocks = blocks.iter_blocks(after=previous_hash, verify=False)
+    else:
+        blocks = iter(blocks)
+        # a checkpoint of an empty chain has no blocks to skip
+        if num_blocks:
+            last = None
+            for last in itertools.islice(blocks, num_blocks):
+                pass
+            if last is None or last.hash != checkpoint.block_hash:
+                raise ValueError('chain does not match the checkpoint')
+
+    def batches():
+        while True:
+            batch = list(itertools.islice(blocks, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    # the stored hashes of each batch that has been sent to be hashed, in order
+    stored_hashes = deque()
+
+    def hash_inputs():
+        # the links are checked as the batches are sent off, so the hashing isn't held up
+        nonlocal num_blocks, previous_hash
+        for batch in batches():
+            for block in batch:
+                if block.previous_hash != previous_hash:
+                    raise ValueError('block {} does not follow the block before it'.format(num_blocks))
+                previous_hash = block.hash
+                num_blocks += 1
+            stored_hashes.append([block.hash for block in batch])
+            # plain tuples pickle much faster than struct_time
+            yield [(tuple(block.timestamp), block.data, block.previous_hash, block.nonce) for block in batch]
+
+    position = num_blocks
+    for hashes in map_batches(hash_batch, hash_inputs(), workers):
+        for stored_hash, block_hash in zip(stored_hashes.popleft(), hashes):
+            if stored_hash != block_hash:
+                raise ValueError('block {} has the wrong hash'.format(position))
+            if difficulty and not meets_difficulty(block_hash, difficulty):
+                raise ValueError('block {} does not meet the difficulty'.format(position))
+            position += 1
+    return Checkpoint.sign(num_blocks, previous_hash, key)
+
+
+# number of nonces each mining task tries
+MINING_CHUNK_SIZE = 100000
+# number of nonces tried between checks for another worker having found one
+MINING_CHECK_EVERY = 4096
+# set in each mining process, to tell it to stop once a nonce has been found
+mining_cancelled = None
+
+
+def init_mining_worker(cancelled):
+    global mining_cancelled
+    mining_cancelled = cancelled
+
+
+def search_nonces(prefix, start, stop, difficulty):
+    """Try the nonces in range(start, stop) until one gives a hash that meets the difficulty
+
+    The prefix is only hashed once, and each attempt continues from a copy of that state.
+
+    Args:
+        prefix (bytes): the bytes hashed before the nonce, from block_hash_prefix
+        start (int): first nonce to try
+        stop (int): one past the last nonce to try
+        difficulty (int): number of zero bits the hash has to start with
+    Returns:
+        tuple of (nonce or None, number of nonces tried)
+    """
+    prefix_state = hashlib.sha256(prefix)
+    target = 1 << (256 - difficulty)
+    from_bytes = int.from_bytes
+    for chunk_start in range(start, stop, MINING_CHECK_EVERY):
+        if mining_cancelled is not None and mining_cancelled.is_set():
+            return None, chunk_start - start
+        for nonce in range(chunk_start, min(chunk_start + MINING_CHECK_EVERY, stop)):
+            sha = prefix_state.copy()
+            sha.update(str(nonce).encode())
+            if from_bytes(sha.digest(), 'big') < target:
+                return nonce, nonce - start + 1
+    return None, stop - start
+
+
+def mine_block(timestamp, data, previous_hash, difficulty, workers=1, chunk_size=MINING_CHUNK_SIZE):
+    """Find a nonce that makes the block's hash start with difficulty zero bits
+
+    Ranges of chunk_size nonces are searched on a pool of processes. As soon as one of them
+    finds a nonce, the others are told to stop and the ranges not started yet are cancelled.
+    Each extra bit of difficulty doubles the expected number of attempts.
+
+    Args:
+        timestamp (time.struct_time): when the block was created (GMT)
+        data (str): the block's data
+        previous_hash (str): hash of the previous block, or None for the first block
+        difficulty (int): number of zero bits the hash has to start with
+        workers (int): number of processes
+        chunk_size (int): number of nonces in each range
+    Returns:
+        tuple of (Block, number of hashes computed)
+    """
+    if not 0 <= difficulty <= 256:
+        raise ValueError('difficulty must be between 0 and 256')
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    prefix = block_hash_prefix(timestamp, data, previous_hash)
+    attempts = 0
+    if workers == 1:
+        for start in itertools.count(0, chunk_size):
+            nonce, tried = search_nonces(prefix, start, start + chunk_size, difficulty)
+            attempts += tried
+            if nonce is not None:
+                return Block(timestamp, data, previous_hash, nonce=nonce), attempts
+    cancelled = multiprocessing.Event()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_mining_worker, initargs=(cancelled,)) as pool:
+        starts = itertools.count(0, chunk_size)
+        pending = {pool.submit(search_nonces, prefix, start, start + chunk_size, difficulty)
+                   for start in itertools.islice(starts, workers * 2)}
+        found = None
+        while found is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                nonce, tried = future.result()
+                attempts += tried
+                if nonce is not None and found is None:
+                    found = nonce
+            if found is None:
+                pending |= {pool.submit(search_nonces, prefix, start, start + chunk_size, difficulty)
+                            for start in itertools.islice(starts, len(done))}
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+        for future in pending:
+            if not future.cancelled():
+                attempts += future.result()[1]
+    return Block(timestamp, data, previous_hash, nonce=found), attempts
 
 
 class BlockChainTestCase(unittest.TestCase):
@@ -80,5 +774,306 @@ class BlockChainTestCase(unittest.TestCase):
             Block(time.gmtime(), None, None)
 
 
+class BlockStoreTestCase(unittest.TestCase):
+    def make_chain(self, num_blocks):
+        gmt = time.gmtime()
+        blocks = [Block(gmt, "block 0", None)]
+        for i in range(1, num_blocks):
+            blocks.append(Block(gmt, "block {} \u2603".format(i) * (i % 5), blocks[-1].hash))
+        return blocks
+
+    def assertSameBlock(self, block, expected):
+        self.assertEqual(block.hash, expected.hash)
+        self.assertEqual(block.data, expected.data)
+        self.assertEqual(block.previous_hash, expected.previous_hash)
+        self.assertEqual(calendar.timegm(block.timestamp), calendar.timegm(expected.timestamp))
+
+    def test_append_and_get(self):
+        blocks = self.make_chain(3000)
+        with TempDir() as path:
+            with BlockStore(path, segment_size=4096, sync_every=100) as store:
+                self.assertIsNone(store.tail())
+                for block in blocks:
+                    store.append(block)
+                self.assertEqual(len(store), 3000)
+                self.assertGreater(store.end_segment, 10)
+                for block in blocks[::7]:
+                    self.assertSameBlock(store.get(block.hash), block)
+                self.assertSameBlock(store.tail(), blocks[-1])
+                self.assertIsNone(store.get('00' * 32))
+                self.assertIsNone(store.get('not a hash'))
+                self.assertNotIn('00' * 32, store)
+            # reopen
+            with BlockStore(path, segment_size=4096) as store:
+                self.assertEqual(len(store), 3000)
+                self.assertSameBlock(store.get(blocks[1234].hash), blocks[1234])
+                self.assertSameBlock(store.tail(), blocks[-1])
+                self.assertEqual([block.hash for block in store], [block.hash for block in blocks])
+                more = Block(time.gmtime(), "one more", blocks[-1].hash)
+                store.append(more)
+            with BlockStore(path, segment_size=4096) as store:
+                self.assertSameBlock(store.tail(), more)
+
+    def test_block_must_follow_the_tail(self):
+        blocks = self.make_chain(3)
+        with TempDir() as path, BlockStore(path) as store:
+            with self.assertRaises(ValueError):
+                store.append(blocks[1])
+            store.append(blocks[0])
+            with self.assertRaises(ValueError):
+                store.append(blocks[2])
+
+    def test_recover_unindexed_blocks(self):
+        blocks = self.make_chain(50)
+        with TempDir() as path:
+            with BlockStore(path, segment_size=1024) as store:
+                for block in blocks[:20]:
+                    store.append(block)
+            # blocks appended after a copy of the index was taken, as if they never reached it
+            with open(os.path.join(path, 'index'), 'rb') as f:
+                old_index = f.read()
+            with BlockStore(path, segment_size=1024) as store:
+                for block in blocks[20:]:
+                    store.append(block)
+            with open(os.path.join(path, 'index'), 'wb') as f:
+                f.write(old_index)
+            # and half of another block
+            last_segment = max(name for name in os.listdir(path) if name.startswith('segment'))
+            with open(os.path.join(path, last_segment), 'ab') as f:
+                f.write(b'\x01\x02\x03')
+            with BlockStore(path, segment_size=1024) as store:
+                self.assertEqual(len(store), 50)
+                self.assertSameBlock(store.tail(), blocks[-1])
+                self.assertSameBlock(store.get(blocks[30].hash), blocks[30])
+                self.assertEqual(len(list(store)), 50)
+
+    def test_process_killed_between_syncs(self):
+        # appends with the default sync_every, then dies without closing the store
+        script = '\n'.join([
+            'import os, sys, time',
+            'from problem_5 import Block, BlockStore',
+            'store = BlockStore(sys.argv[1])',
+            'previous_hash = None',
+            'for i in range(50):',
+            '    block = Block(time.gmtime(1500000000 + i), "block {}".format(i), previous_hash)',
+            '    store.append(block)',
+            '    previous_hash = block.hash',
+            'print(previous_hash)',
+            'os._exit(0)',
+        ])
+        with TempDir() as path:
+            result = subprocess.run([sys.executable, '-c', script, path], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            with BlockStore(path) as store:
+                self.assertEqual(len(store), 50)
+                self.assertEqual(store.tail().hash, result.stdout.strip())
+                self.assertEqual(verify_chain(store, b'key').num_blocks, 50)
+
+    def test_drop_blocks_missing_from_the_segment(self):
+        blocks = self.make_chain(50)
+        with TempDir() as path:
+            with BlockStore(path, segment_size=1024) as store:
+                for block in blocks:
+                    store.append(block)
+                _, segment, offset = store.find_slot(bytes.fromhex(blocks[45].hash))
+            # the index reached the disk but the end of the last segment didn't
+            self.assertEqual(segment, store.end_segment)
+            with open(store.segment_path(segment), 'r+b') as f:
+                f.truncate(offset + 10)
+            with BlockStore(path, segment_size=1024) as store:
+                self.assertEqual(len(store), 45)
+                self.assertSameBlock(store.tail(), blocks[44])
+                self.assertIsNone(store.get(blocks[45].hash))
+                self.assertSameBlock(store.get(blocks[30].hash), blocks[30])
+                self.assertEqual([block.hash for block in store], [block.hash for block in blocks[:45]])
+                store.append(blocks[45])
+            with BlockStore(path, segment_size=1024) as store:
+                self.assertEqual(len(store), 46)
+                self.assertSameBlock(store.tail(), blocks[45])
+            # and the whole of the last segment
+            with open(store.segment_path(segment), 'r+b') as f:
+                f.truncate(0)
+            with BlockStore(path, segment_size=1024) as store:
+                remaining = list(store)
+                self.assertLess(len(remaining), 46)
+                self.assertEqual(len(store), len(remaining))
+                self.assertSameBlock(store.tail(), remaining[-1])
+                store.append(blocks[len(remaining)])
+
+
+class VerifyChainTestCase(unittest.TestCase):
+    KEY = b'secret key'
+
+    def make_chain(self, num_blocks, previous_hash=None):
+        blocks = []
+        for i in range(num_blocks):
+            blocks.append(Block(time.gmtime(1500000000 + i), "block {}".format(i), previous_hash))
+            previous_hash = blocks[-1].hash
+        return blocks
+
+    def test_hash_includes_timestamp(self):
+        first = Block(time.gmtime(1500000000), "data", None)
+        second = Block(time.gmtime(1500000001), "data", None)
+        self.assertNotEqual(first.hash, second.hash)
+
+    def test_valid_chain(self):
+        blocks = self.make_chain(2500)
+        for workers in (1, 2):
+            checkpoint = verify_chain(blocks, self.KEY, workers=workers, batch_size=100)
+            self.assertEqual(checkpoint.num_blocks, 2500)
+            self.assertEqual(checkpoint.block_hash, blocks[-1].hash)
+            self.assertTrue(checkpoint.is_valid(self.KEY))
+            self.assertFalse(checkpoint.is_valid(b'another key'))
+        empty = verify_chain([], self.KEY)
+        self.assertEqual((empty.num_blocks, empty.block_hash), (0, None))
+
+    def test_tampered_data(self):
+        blocks = self.make_chain(500)
+        blocks[321].data = "block 321 - paid twice"
+        with self.assertRaisesRegex(ValueError, 'block 321 has the wrong hash'):
+            verify_chain(blocks, self.KEY, batch_size=100)
+
+    def test_broken_link(self):
+        blocks = self.make_chain(500)
+        del blocks[200]
+        with self.assertRaisesRegex(ValueError, 'block 200 does not follow'):
+            verify_chain(blocks, self.KEY, workers=2, batch_size=64)
+
+    def test_resume_from_checkpoint(self):
+        blocks = self.make_chain(300)
+        # a checkpoint taken before there were any blocks
+        empty = verify_chain([], self.KEY)
+        resumed = verify_chain(blocks, self.KEY, empty)
+        self.assertEqual((resumed.num_blocks, resumed.block_hash), (300, blocks[-1].hash))
+        with self.assertRaisesRegex(ValueError, 'checkpoint'):
+            verify_chain(blocks, self.KEY, Checkpoint.sign(0, blocks[0].hash, self.KEY))
+        checkpoint = verify_chain(blocks, self.KEY)
+        blocks += self.make_chain(200, blocks[-1].hash)
+        # blocks before the checkpoint aren't hashed again
+        blocks[10].data = "changed after the audit"
+        resumed = verify_chain(blocks, self.KEY, checkpoint)
+        self.assertEqual((resumed.num_blocks, resumed.block_hash), (500, blocks[-1].hash))
+        blocks[400].data = "changed"
+        with self.assertRaisesRegex(ValueError, 'block 400'):
+            verify_chain(blocks, self.KEY, checkpoint)
+        with self.assertRaises(ValueError):
+            verify_chain(blocks[:100], self.KEY, checkpoint)
+        forged = Checkpoint(500, blocks[-1].hash, checkpoint.signature)
+        with self.assertRaisesRegex(ValueError, 'signature'):
+            verify_chain(blocks, self.KEY, forged)
+
+    def test_block_store(self):
+        blocks = self.make_chain(300)
+        with TempDir() as path:
+            with BlockStore(path, segment_size=2048) as store:
+                for block in blocks[:200]:
+                    store.append(block)
+                checkpoint = verify_chain(store, self.KEY, workers=2, batch_size=50)
+                self.assertEqual(checkpoint.num_blocks, 200)
+                checkpoint.save(os.path.join(path, 'checkpoint'))
+                for block in blocks[200:]:
+                    store.append(block)
+            with BlockStore(path, segment_size=2048) as store:
+                checkpoint = Checkpoint.load(os.path.join(path, 'checkpoint'))
+                resumed = verify_chain(store, self.KEY, checkpoint)
+                self.assertEqual((resumed.num_blocks, resumed.block_hash), (300, blocks[-1].hash))
+                self.assertEqual(verify_chain(store, self.KEY).signature, resumed.signature)
+
+
+class MerkleTestCase(unittest.TestCase):
+    def test_proofs(self):
+        for num_transactions in (1, 2, 3, 7, 8, 1000):
+            transactions = ["payment {}".format(i) for i in range(num_transactions)]
+            block = Block.from_transactions(time.gmtime(), transactions, None)
+            self.assertEqual(block.data, merkle_levels(transactions)[-1][0].hex())
+            for index, transaction in enumerate(transactions):
+                proof = block.prove(index)
+                self.assertLessEqual(len(proof), max(1, (num_transactions - 1).bit_length()))
+                self.assertTrue(verify_merkle_proof(transaction, proof, block.data))
+                self.assertFalse(verify_merkle_proof(transaction + "0", proof, block.data))
+            if num_transactions > 1:
+                self.assertFalse(verify_merkle_proof(transactions[0], block.prove(1), block.data))
+
+    def test_root_changes_block_hash(self):
+        gmt = time.gmtime()
+        block = Block.from_transactions(gmt, ["a", "b", "c"], None)
+        self.assertNotEqual(block.hash, Block.from_transactions(gmt, ["a", "b", "d"], None).hash)
+        self.assertNotEqual(block.hash, Block.from_transactions(gmt, ["a", "c", "b"], None).hash)
+
+    def test_odd_levels_cannot_be_padded(self):
+        # an odd hash isn't paired with a copy of itself, so repeating the last transaction
+        # gives a different root
+        self.assertNotEqual(merkle_levels(["a", "b", "c"])[-1], merkle_levels(["a", "b", "c", "c"])[-1])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Block.from_transactions(time.gmtime(), [], None)
+        with self.assertRaises(ValueError):
+            Block(time.gmtime(), "data", None).prove(0)
+        with self.assertRaises(IndexError):
+            Block.from_transactions(time.gmtime(), ["a"], None).prove(1)
+
+    def test_blocks_chain_and_verify(self):
+        blocks = []
+        previous_hash = None
+        for i in range(5):
+            blocks.append(Block.from_transactions(time.gmtime(), ["tx {} {}".format(i, j) for j in range(10)],
+                                                  previous_hash))
+            previous_hash = blocks[-1].hash
+        verify_chain(blocks, b'key')
+        with TempDir() as path, BlockStore(path) as store:
+            for block in blocks:
+                store.append(block)
+            self.assertEqual(store.get(blocks[2].hash).data, blocks[2].data)
+            self.assertTrue(verify_merkle_proof("tx 2 7", blocks[2].prove(7), store.get(blocks[2].hash).data))
+
+
+class MiningTestCase(unittest.TestCase):
+    def test_mine_block(self):
+        gmt = time.gmtime()
+        for workers in (1, 2):
+            block, attempts = mine_block(gmt, "mined", None, difficulty=12, workers=workers, chunk_size=1000)
+            self.assertTrue(meets_difficulty(block.hash, 12))
+            self.assertEqual(block.hash, block.calc_hash())
+            self.assertEqual(block.hash, Block(gmt, "mined", None, nonce=block.nonce).hash)
+            self.assertGreaterEqual(attempts, 1)
+        # any nonce will do
+        block, attempts = mine_block(gmt, "easy", None, difficulty=0)
+        self.assertEqual((block.nonce, attempts), (0, 1))
+
+    def test_nonce_changes_hash(self):
+        gmt = time.gmtime()
+        self.assertNotEqual(Block(gmt, "data", None, nonce=1).hash, Block(gmt, "data", None, nonce=2).hash)
+        # blocks without a nonce hash as they always did
+        self.assertEqual(Block(gmt, "data", None).hash, calc_block_hash(gmt, "data", None))
+
+    def test_verify_difficulty(self):
+        gmt = time.gmtime(1500000000)
+        blocks = []
+        previous_hash = None
+        for i in range(5):
+            block, _ = mine_block(gmt, "block {}".format(i), previous_hash, difficulty=8)
+            blocks.append(block)
+            previous_hash = block.hash
+        verify_chain(blocks, b'key', difficulty=8)
+        with TempDir() as path, BlockStore(path) as store:
+            for block in blocks:
+                store.append(block)
+            self.assertEqual(store.get(blocks[3].hash).nonce, blocks[3].nonce)
+            verify_chain(store, b'key', difficulty=8)
+        # a nonce that doesn't meet the difficulty
+        nonce = next(nonce for nonce in itertools.count()
+                     if not meets_difficulty(calc_block_hash(gmt, "not mined", previous_hash, nonce), 8))
+        blocks.append(Block(gmt, "not mined", previous_hash, nonce=nonce))
+        with self.assertRaisesRegex(ValueError, 'block 5 does not meet the difficulty'):
+            verify_chain(blocks, b'key', difficulty=8)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            mine_block(time.gmtime(), "data", None, difficulty=257)
+        with self.assertRaises(ValueError):
+            mine_block(time.gmtime(), "data", None, difficulty=1, workers=0)
+
+
 if __name__ == '__main__':
     unittest.main()
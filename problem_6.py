@@ -12,6 +12,8 @@ import unittest
 
 
 class Node:
+    __slots__ = ('value', 'next')
+
     def __init__(self, value):
         self.value = value
         self.next = None
@@ -23,6 +25,31 @@ class Node:
 class LinkedList:
     def __init__(self):
         self.head = None
+        self.tail = None
+        self.length = 0
+
+    @classmethod
+    def from_iterable(cls, values):
+        """Build a linked list holding values, in order
+
+        Args:
+            values (iterable): the values
+        Returns:
+            LinkedList
+        """
+        llist = cls()
+        for value in values:
+            llist.append(value)
+        return llist
+
+    def __iter__(self):
+        node = self.head
+        while node:
+            yield node.value
+            node = node.next
+
+    def __len__(self):
+        return self.length
 
     def __str__(self):
         cur_head = self.head
@@ -36,25 +63,16 @@ class LinkedList:
         return out_string
 
     def append(self, value):
-
+        node = Node(value)
         if self.head is None:
-            self.head = Node(value)
-            return
-
-        node = self.head
-        while node.next:
-            node = node.next
-
-        node.next = Node(value)
+            self.head = node
+        else:
+            self.tail.next = node
+        self.tail = node
+        self.length += 1
 
     def size(self):
-        size = 0
-        node = self.head
-        while node:
-            size += 1
-            node = node.next
-
-        return size
+        return self.length
 
 
 def union(llist_1, llist_2):
@@ -72,24 +90,12 @@ def union(llist_1, llist_2):
         raise ValueError("llist2 cannot be None")
     unique_vals = set()
     union_llist = LinkedList()
-    # traverse the first linked list
-    if llist_1.head:
-        node = llist_1.head
-        while node:
-            if node.value not in unique_vals:
-                unique_vals.add(node.value)
-                new_node = Node(node.value)
-                union_llist.append(new_node)
-            node = node.next
-    # traverse the second linked list
-    if llist_2.head:
-        node = llist_2.head
-        while node:
-            if node.value not in unique_vals:
-                unique_vals.add(node.value)
-                new_node = Node(node.value)
-                union_llist.append(new_node)
-            node = node.next
+    # traverse the first linked list, then the second
+    for llist in (llist_1, llist_2):
+        for value in llist:
+            if value not in unique_vals:
+                unique_vals.add(value)
+                union_llist.append(value)
     return union_llist if union_llist.head else None
 
 
@@ -115,20 +121,12 @@ def intersection(llist_1, llist_2):
     unique_vals_out = set()  # handle non-unique values in second linked list
     intersection_llist = LinkedList()
     # traverse the first linked list getting the unique values
-    if llist_1.head:
-        node = llist_1.head
-        while node:
-            unique_vals_1.add(node.value)
-            node = node.next
+    unique_vals_1.update(llist_1)
     # traverse the second linked list
-    if llist_2.head:
-        node = llist_2.head
-        while node:
-            if node.value in unique_vals_1 and node.value not in unique_vals_out:
-                new_node = Node(node.value)
-                intersection_llist.append(new_node)
-                unique_vals_out.add(node.value)
-            node = node.next
+    for value in llist_2:
+        if value in unique_vals_1 and value not in unique_vals_out:
+            intersection_llist.append(value)
+            unique_vals_out.add(value)
     return intersection_llist if intersection_llist.head else None
 
 
@@ -186,6 +184,38 @@ class UnionIntersectionTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             intersection(linked_list, None)
 
+    def test_output_holds_values(self):
+        linked_list_1 = LinkedList.from_iterable([3, 2, 4])
+        linked_list_2 = LinkedList.from_iterable([4, 5])
+        for output in (union(linked_list_1, linked_list_2), intersection(linked_list_1, linked_list_2)):
+            node = output.head
+            while node:
+                self.assertIsInstance(node.value, int)
+                node = node.next
+
+
+class LinkedListTestCase(unittest.TestCase):
+    def test_append_and_size(self):
+        linked_list = LinkedList()
+        self.assertEqual((linked_list.size(), len(linked_list), list(linked_list)), (0, 0, []))
+        for i in range(5):
+            linked_list.append(i)
+        self.assertEqual((linked_list.size(), len(linked_list), list(linked_list)), (5, 5, [0, 1, 2, 3, 4]))
+        self.assertEqual(linked_list.tail.value, 4)
+        self.assertEqual(str(linked_list), '0 -> 1 -> 2 -> 3 -> 4')
+
+    def test_from_iterable(self):
+        linked_list = LinkedList.from_iterable(x * x for x in range(4))
+        self.assertEqual(list(linked_list), [0, 1, 4, 9])
+        self.assertEqual(len(linked_list), 4)
+        linked_list.append(16)
+        self.assertEqual(list(linked_list), [0, 1, 4, 9, 16])
+        self.assertEqual(len(LinkedList.from_iterable([])), 0)
+
+    def test_node_slots(self):
+        with self.assertRaises(AttributeError):
+            Node(1).previous = None
+
 
 if __name__ == '__main__':
     unittest.main()